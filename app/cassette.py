@@ -0,0 +1,192 @@
+import hashlib
+import itertools
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+import requests
+from fastapi import HTTPException
+
+from app.config import UPSTREAM_MODE, CASSETTE_PATH, REPLAY_LATENCY_SCALE
+
+LIVE = "live"
+RECORD = "record"
+REPLAY = "replay"
+
+# Each record is: u32 meta length, meta JSON, u32 body length, raw body.
+LENGTH = struct.Struct(">I")
+# Response fields carrying credentials (OAuth and Connect tokens, account credentials)
+# are replaced before a body is written, so cassettes can be copied off the server.
+REDACTED_FIELDS = {
+    "access_token", "refresh_token", "id_token", "token", "connect_link_url", "client_secret", "credentials",
+    "oauth_access_token", "oauth_refresh_token", "oauth_client_secret", "api_key",
+}
+REDACTED = "[redacted]"
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(method: str, url: str, headers: dict, params: dict | None, json_body) -> str:
+    """
+    Identify a request by everything that shapes the response except credentials.
+    """
+    canonical = json.dumps(
+        [method.upper(), url, headers.get("X-PD-Environment"), sorted((params or {}).items()), json_body],
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def redact(value):
+    """
+    Replace the value of every credential field in a decoded JSON document.
+    """
+    if isinstance(value, dict):
+        return {key: REDACTED if key in REDACTED_FIELDS and item is not None else redact(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def _recorded_body(response: requests.Response) -> bytes:
+    body = response.content
+    if not (response.headers.get("content-type") or "").startswith("application/json"):
+        return body
+    try:
+        document = json.loads(body)
+    except ValueError:
+        return body
+    redacted = redact(document)
+    return body if redacted == document else json.dumps(redacted, separators=(",", ":")).encode()
+
+
+class CassetteRecorder:
+    """
+    Appends request/response pairs and their upstream timings to a cassette file.
+    Credential fields of JSON responses are redacted before they are written.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab")
+        self._lock = threading.Lock()
+
+    def send(self, session: requests.Session, method: str, url: str, headers: dict, params: dict | None,
+             json_body) -> requests.Response:
+        started = time.perf_counter()
+        response = session.request(method, url, headers=headers, params=params, json=json_body)
+        elapsed = time.perf_counter() - started
+        meta = json.dumps({
+            "key": request_key(method, url, headers, params, json_body),
+            "method": method,
+            "url": url,
+            "status": response.status_code,
+            "elapsed": elapsed,
+            "content_type": response.headers.get("content-type"),
+        }, separators=(",", ":")).encode()
+        body = _recorded_body(response)
+        with self._lock:
+            self._file.write(LENGTH.pack(len(meta)) + meta + LENGTH.pack(len(body)) + body)
+            self._file.flush()
+        return response
+
+
+class CassettePlayer:
+    """
+    Serves recorded responses from an mmap'd cassette.
+
+    Opening the cassette scans only the record headers to build an index of
+    request key -> body offsets; bodies are sliced out of the mapping on demand.
+    Identical requests recorded several times are replayed in recorded order,
+    cycling once exhausted. Each response is delayed by its recorded upstream
+    latency multiplied by `latency_scale`.
+    """
+
+    def __init__(self, path: str, latency_scale: float = 1.0):
+        self.latency_scale = latency_scale
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+        entries = {}
+        offset = 0
+        while offset < len(self._map):
+            record = self._read_record(offset)
+            if record is None:
+                # A recorder killed mid-write leaves a torn tail; keep every complete record before it.
+                logger.warning("Cassette %s is truncated at byte %d of %d; ignoring the incomplete record",
+                               path, offset, len(self._map))
+                break
+            meta, body_offset, body_length = record
+            entries.setdefault(meta["key"], []).append(
+                (body_offset, body_length, meta["status"], meta["elapsed"], meta.get("content_type"))
+            )
+            offset = body_offset + body_length
+        self._lock = threading.Lock()
+        self._index = {key: itertools.cycle(records) for key, records in entries.items()}
+        self.size = sum(len(records) for records in entries.values())
+
+    def _read_record(self, offset: int) -> tuple | None:
+        """
+        Parse the record header at `offset`, or return None if the record is incomplete.
+        """
+        end = len(self._map)
+        try:
+            if offset + LENGTH.size > end:
+                return None
+            (meta_length,) = LENGTH.unpack_from(self._map, offset)
+            offset += LENGTH.size
+            if offset + meta_length + LENGTH.size > end:
+                return None
+            meta = json.loads(self._map[offset:offset + meta_length])
+            offset += meta_length
+            (body_length,) = LENGTH.unpack_from(self._map, offset)
+            offset += LENGTH.size
+            if offset + body_length > end:
+                return None
+            return meta, offset, body_length
+        except (ValueError, struct.error):
+            return None
+
+    def send(self, session: requests.Session, method: str, url: str, headers: dict, params: dict | None,
+             json_body) -> requests.Response:
+        cycle = self._index.get(request_key(method, url, headers, params, json_body))
+        if cycle is None:
+            raise HTTPException(status_code=502, detail=f"No recorded response for {method} {url}")
+        with self._lock:
+            offset, length, status, elapsed, content_type = next(cycle)
+        if self.latency_scale:
+            time.sleep(elapsed * self.latency_scale)
+        response = requests.Response()
+        response.status_code = status
+        response._content = self._map[offset:offset + length]
+        if content_type:
+            response.headers["Content-Type"] = content_type
+        response.url = url
+        return response
+
+
+def _live_send(session: requests.Session, method: str, url: str, headers: dict, params: dict | None,
+               json_body) -> requests.Response:
+    return session.request(method, url, headers=headers, params=params, json=json_body)
+
+
+def load_transport(mode: str, path: str, latency_scale: float):
+    """
+    Return the send() callable used for upstream requests in the given mode.
+    """
+    if mode == RECORD:
+        return CassetteRecorder(path).send
+    if mode == REPLAY:
+        return CassettePlayer(path, latency_scale).send
+    if mode != LIVE:
+        raise Exception(f"Unknown UPSTREAM_MODE {mode!r}, expected live, record or replay")
+    return _live_send
+
+
+send = load_transport(UPSTREAM_MODE, CASSETTE_PATH, REPLAY_LATENCY_SCALE)
@@ -0,0 +1,83 @@
+import gzip
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+# brotli and zstandard are optional (the `compression` extra); without them only gzip is negotiated.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from app.config import COMPRESSION_MIN_SIZE
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def _compressors() -> dict:
+    compressors = {"gzip": lambda body: gzip.compress(body, compresslevel=5)}
+    if brotli is not None:
+        compressors["br"] = lambda body: brotli.compress(body, quality=4)
+    if zstandard is not None:
+        compressors["zstd"] = zstandard.ZstdCompressor(level=3).compress
+    return compressors
+
+
+COMPRESSORS = _compressors()
+# Server preference when the client accepts several encodings with the same q-value.
+PREFERENCE = ("zstd", "br", "gzip")
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    Pick the best supported encoding from an Accept-Encoding header.
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+    candidates = [
+        encoding for encoding in PREFERENCE
+        if encoding in COMPRESSORS and accepted.get(encoding, accepted.get("*", 0.0)) > 0
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda encoding: accepted.get(encoding, accepted.get("*", 0.0)))
+
+
+async def compression_middleware(request: Request, call_next):
+    """
+    Compress response bodies with the negotiated gzip/brotli/zstd encoding on a
+    worker thread. Bodies smaller than COMPRESSION_MIN_SIZE are sent as-is.
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    response = await call_next(request)
+    if (
+        encoding is None
+        or "content-encoding" in response.headers
+        or not response.headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+    ):
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {key: value for key, value in response.headers.items() if key.lower() != "content-length"}
+    headers["Vary"] = "Accept-Encoding"
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return Response(body, status_code=response.status_code, headers=headers)
+    headers["Content-Encoding"] = encoding
+    compressed = await run_in_threadpool(COMPRESSORS[encoding], body)
+    return Response(compressed, status_code=response.status_code, headers=headers)
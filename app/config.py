@@ -11,6 +11,50 @@ OAUTH_TOKEN=os.getenv("PIPEDREAM_OAUTH_TOKEN")
 CLIENT_ID = os.getenv("PIPEDREAM_CLIENT_ID")
 CLIENT_SECRET = os.getenv("PIPEDREAM_CLIENT_SECRETS")
 
+# Deployed-trigger inventory sync
+TRIGGER_SYNC_INTERVAL = float(os.getenv("TRIGGER_SYNC_INTERVAL", "60"))
+TRIGGER_SYNC_USERS = [user for user in os.getenv("TRIGGER_SYNC_USERS", "").split(",") if user]
+TRIGGER_SYNC_WORKERS = int(os.getenv("TRIGGER_SYNC_WORKERS", "4"))
+# Users synced only because a client queried them: how many to keep, and for how long without a query
+TRIGGER_MAX_QUERIED_USERS = int(os.getenv("TRIGGER_MAX_QUERIED_USERS", "1000"))
+TRIGGER_QUERIED_USER_TTL = float(os.getenv("TRIGGER_QUERIED_USER_TTL", "3600"))
+
+# Responses smaller than this many bytes are not compressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# JSON file describing webhook fan-out sinks and routing rules
+FANOUT_CONFIG = os.getenv("FANOUT_CONFIG")
+
+# Per-tenant admission control and fair scheduling of upstream calls
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "16"))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "10"))
+# Tenants are projects ("<project_id>/<environment>"); requests for the default project are "default".
+# Per-tenant in-flight budgets: interactive requests and batch (action run) requests
+TENANT_MAX_IN_FLIGHT = int(os.getenv("TENANT_MAX_IN_FLIGHT", "8"))
+TENANT_MAX_BATCH_IN_FLIGHT = int(os.getenv("TENANT_MAX_BATCH_IN_FLIGHT", "4"))
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+# Budget of the default tenant, which every caller that selects no project shares
+DEFAULT_TENANT_MAX_IN_FLIGHT = int(os.getenv("DEFAULT_TENANT_MAX_IN_FLIGHT", str(ADMISSION_MAX_IN_FLIGHT)))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "1"))
+# e.g. "proj_abc/production=2,default=0.5"; unlisted tenants have weight 1
+TENANT_WEIGHTS = {
+    tenant.strip(): float(weight)
+    for tenant, _, weight in (item.partition("=") for item in os.getenv("TENANT_WEIGHTS", "").split(",") if item)
+}
+
+# Upstream traffic mode: live, record (append to the cassette) or replay (serve from it)
+UPSTREAM_MODE = os.getenv("UPSTREAM_MODE", "live")
+# Cassettes hold real response bodies (account data, user IDs, ...). Token and credential
+# fields are redacted when recording, but treat the file as sensitive all the same.
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassettes/upstream.cassette")
+# Multiplier applied to recorded latencies in replay mode; 0 replays instantly
+REPLAY_LATENCY_SCALE = float(os.getenv("REPLAY_LATENCY_SCALE", "1"))
+
+# Project registry: JSON list of extra projects, re-read when the file changes
+PROJECTS_FILE = os.getenv("PROJECTS_FILE")
+PROJECTS_RELOAD_INTERVAL = float(os.getenv("PROJECTS_RELOAD_INTERVAL", "5"))
+PROJECT_POOL_SIZE = int(os.getenv("PROJECT_POOL_SIZE", "10"))
+
 if not API_TOKEN:
     raise Exception("PIPEDREAM_API_TOKEN not set in environment")
 
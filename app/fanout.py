@@ -0,0 +1,319 @@
+import abc
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from fnmatch import fnmatch
+
+import requests
+
+from app.config import FANOUT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class Sink(abc.ABC):
+    """
+    An event consumer with its own bounded queue and worker thread.
+
+    The worker sends events in batches of up to `batch_size`, waiting at most
+    `flush_interval` seconds to fill a batch, and retries failed sends with
+    exponential backoff. Batches that still fail, and events that arrive while
+    the queue is full, are handed to a separate writer thread that appends them
+    to the `dead_letter` JSONL file, so a slow sink never blocks the caller or
+    any other sink.
+    """
+
+    def __init__(self, name: str, queue_size: int = 1000, batch_size: int = 50, flush_interval: float = 1.0,
+                 max_retries: int = 3, backoff: float = 0.5, dead_letter: str | None = None,
+                 shutdown_timeout: float = 5.0):
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.shutdown_timeout = shutdown_timeout
+        self.dead_letter = dead_letter or f"dead_letter/{name}.jsonl"
+        self._queue = queue.Queue(maxsize=queue_size)
+        # (events, reason) tuples, or None to stop the writer
+        self._dead_letters = queue.SimpleQueue()
+        # Guards _closing, _writer_stopped and _in_flight against close() racing the worker and callers.
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._closing = threading.Event()
+        self._writer_stopped = False
+        # The batch the worker is sending; close() takes it over if the worker is still busy.
+        self._in_flight = None
+        self.sent = 0
+        self.dead_lettered = 0
+        self._thread = threading.Thread(target=self._loop, name=f"sink-{name}", daemon=True)
+        self._thread.start()
+        self._dead_letter_thread = threading.Thread(target=self._dead_letter_loop, name=f"sink-{name}-dead-letter",
+                                                    daemon=True)
+        self._dead_letter_thread.start()
+
+    @abc.abstractmethod
+    def send(self, batch: list):
+        """
+        Deliver a batch of events; raise to trigger a retry.
+        """
+
+    def enqueue(self, event: dict) -> bool:
+        """
+        Queue an event without blocking. Returns False if it was dead-lettered instead.
+        """
+        with self._lock:
+            if self._closing.is_set():
+                reason = "shutdown"
+            else:
+                try:
+                    self._queue.put_nowait(event)
+                    return True
+                except queue.Full:
+                    reason = "queue full"
+        self._dead_letter([event], reason)
+        return False
+
+    def _dead_letter(self, batch: list, reason: str):
+        with self._lock:
+            if not self._writer_stopped:
+                self._dead_letters.put((batch, reason))
+                return
+        # The writer is gone once close() returned; write late batches directly.
+        self._write_dead_letters(batch, reason)
+
+    def _write_dead_letters(self, batch: list, reason: str):
+        try:
+            directory = os.path.dirname(self.dead_letter)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._write_lock:
+                with open(self.dead_letter, "a") as f:
+                    for event in batch:
+                        f.write(json.dumps({"sink": self.name, "reason": reason, "event": event}) + "\n")
+                self.dead_lettered += len(batch)
+        except Exception:
+            logger.exception("Failed to dead-letter %d events for sink %s", len(batch), self.name)
+
+    def _dead_letter_loop(self):
+        while True:
+            item = self._dead_letters.get()
+            if item is None:
+                return
+            self._write_dead_letters(*item)
+
+    def _next_batch(self) -> list | None:
+        """
+        Wait for the next batch; returns None once closing and the queue is drained.
+        """
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+                break
+            except queue.Empty:
+                if self._closing.is_set():
+                    return None
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _deliver(self, batch: list) -> str | None:
+        """
+        Send a batch with retries; returns the last error, or None once delivered.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.send(batch)
+                return None
+            except Exception as err:
+                if attempt == self.max_retries:
+                    return str(err)
+                # Backoff is cut short when shutting down.
+                self._closing.wait(self.backoff * 2 ** attempt)
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            with self._lock:
+                self._in_flight = batch
+            error = self._deliver(batch)
+            with self._lock:
+                # False if close() gave up waiting and already dead-lettered the batch.
+                owned = self._in_flight is batch
+                self._in_flight = None
+            if error is None:
+                self.sent += len(batch)
+            elif owned:
+                self._dead_letter(batch, error)
+
+    def close(self):
+        """
+        Flush the queue, waiting up to `shutdown_timeout` seconds for the worker, then
+        dead-letter whatever is still queued or being sent. A batch still inside
+        send() is dead-lettered too, so it may end up both delivered and dead-lettered,
+        but an acked event is never lost.
+        """
+        with self._lock:
+            self._closing.set()
+        self._thread.join(self.shutdown_timeout)
+        with self._lock:
+            remaining = list(self._in_flight or [])
+            self._in_flight = None
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if remaining:
+            self._dead_letters.put((remaining, "shutdown"))
+        with self._lock:
+            self._writer_stopped = True
+            self._dead_letters.put(None)
+        self._dead_letter_thread.join()
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "sent": self.sent, "dead_lettered": self.dead_lettered}
+
+
+class HttpSink(Sink):
+    """
+    POSTs each batch as a JSON array to a local HTTP service.
+    """
+
+    def __init__(self, name: str, url: str, timeout: float = 5.0, **options):
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+        super().__init__(name, **options)
+
+    def send(self, batch: list):
+        response = self._session.post(self.url, json=batch, timeout=self.timeout)
+        if response.status_code >= 300:
+            raise Exception(f"{self.url} returned {response.status_code}: {response.text[:200]}")
+
+
+class FileSink(Sink):
+    """
+    Appends events as JSON lines to a file.
+    """
+
+    def __init__(self, name: str, path: str, **options):
+        self.path = path
+        super().__init__(name, **options)
+
+    def send(self, batch: list):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(event) + "\n" for event in batch))
+
+
+class UnixSocketSink(Sink):
+    """
+    Streams events as JSON lines to a Unix-socket subscriber, reconnecting on failure.
+    """
+
+    def __init__(self, name: str, path: str, timeout: float = 5.0, **options):
+        self.path = path
+        self.timeout = timeout
+        self._socket = None
+        super().__init__(name, **options)
+
+    def send(self, batch: list):
+        payload = "".join(json.dumps(event) + "\n" for event in batch).encode()
+        try:
+            if self._socket is None:
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._socket.settimeout(self.timeout)
+                self._socket.connect(self.path)
+            self._socket.sendall(payload)
+        except OSError:
+            if self._socket is not None:
+                self._socket.close()
+            self._socket = None
+            raise
+
+
+SINK_TYPES = {"http": HttpSink, "file": FileSink, "unix": UnixSocketSink}
+
+
+def event_attributes(event, headers) -> dict:
+    """
+    Extract the routing attributes of a received Pipedream event.
+    """
+    body = event if isinstance(event, dict) else {}
+    return {
+        "source": headers.get("x-pd-emitter-id") or body.get("emitter_id") or body.get("source") or "",
+        "type": body.get("type") or body.get("event") or "",
+    }
+
+
+class FanoutDispatcher:
+    """
+    Routes received events to sinks. Each route is {"match": {"source": ..., "type": ...}, "sinks": [...]},
+    where match values are fnmatch patterns and missing keys match anything.
+    """
+
+    def __init__(self, sinks: dict, routes: list):
+        self.sinks = sinks
+        self.routes = routes
+
+    @classmethod
+    def from_config(cls, path: str | None):
+        if not path:
+            return cls({}, [])
+        with open(path) as f:
+            config = json.load(f)
+        sinks = {}
+        for name, options in (config.get("sinks") or {}).items():
+            options = dict(options)
+            sink_type = options.pop("type")
+            if sink_type not in SINK_TYPES:
+                raise Exception(f"Unknown sink type {sink_type!r} for sink {name!r}")
+            sinks[name] = SINK_TYPES[sink_type](name, **options)
+        routes = config.get("routes") or []
+        for route in routes:
+            for name in route.get("sinks", []):
+                if name not in sinks:
+                    raise Exception(f"Route references unknown sink {name!r}")
+        return cls(sinks, routes)
+
+    def match(self, attributes: dict) -> list:
+        names = []
+        for route in self.routes:
+            patterns = route.get("match") or {}
+            if all(fnmatch(str(attributes.get(key, "")), pattern) for key, pattern in patterns.items()):
+                names.extend(name for name in route["sinks"] if name not in names)
+        return names
+
+    def dispatch(self, event, headers) -> list:
+        """
+        Enqueue the event on every matching sink. Never blocks on a sink.
+        """
+        names = self.match(event_attributes(event, headers))
+        for name in names:
+            self.sinks[name].enqueue(event)
+        return names
+
+    def close(self):
+        for sink in self.sinks.values():
+            sink.close()
+
+    def stats(self) -> dict:
+        return {name: sink.stats() for name, sink in self.sinks.items()}
+
+
+dispatcher = FanoutDispatcher.from_config(FANOUT_CONFIG)
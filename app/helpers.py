@@ -1,7 +1,9 @@
 import base64
-import requests
 from fastapi import HTTPException
-from app.config import OAUTH_TOKEN, BASE_URL
+from app.config import BASE_URL
+from app.projects import Project, get_current_project
+from app.scheduler import upstream_slot
+from app import cassette
 def encode_url(url: str) -> str:
     """
     URL safe Base64 encode the given URL.
@@ -11,15 +13,65 @@ def encode_url(url: str) -> str:
 
 
 
-def proxy_get(endpoint: str, params: dict = None, environment: str|None = None):
+def proxy_request(method: str, endpoint: str, params: dict = None, json: dict = None, environment: str|None = None,
+                  project: Project|None = None):
     """
-    Helper function to perform a GET request to the Pipedream API.
+    Helper function to perform a request to the Pipedream API.
+    Returns the decoded JSON body, or None for empty responses (e.g. DELETE).
+    Uses the credentials, environment and connection pool of `project` (default: the
+    request's project) and goes through the configured cassette transport.
     """
-    headers = {"Authorization": f"Bearer {OAUTH_TOKEN}"}
-    if environment:
-        headers["X-PD-Environment"] = environment
+    project = project or get_current_project()
+    headers = {
+        "Authorization": f"Bearer {project.tokens.token()}",
+        "X-PD-Environment": environment or project.environment,
+    }
+    if json is not None:
+        headers["Content-Type"] = "application/json"
     url = f"{BASE_URL}{endpoint}"
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code != 200:
+    with upstream_slot():
+        response = cassette.send(project.session, method, url, headers, params, json)
+    if response.status_code not in (200, 204):
         raise HTTPException(status_code=response.status_code, detail=response.text)
+    if not response.content:
+        return None
     return response.json()
+
+
+def proxy_get(endpoint: str, params: dict = None, environment: str|None = None, project: Project|None = None):
+    """
+    Helper function to perform a GET request to the Pipedream API.
+    """
+    return proxy_request("GET", endpoint, params=params, environment=environment, project=project)
+
+
+def proxy_post(endpoint: str, params: dict = None, json: dict = None, environment: str|None = None,
+               project: Project|None = None):
+    """
+    Helper function to perform a POST request to the Pipedream API.
+    """
+    return proxy_request("POST", endpoint, params=params, json=json, environment=environment, project=project)
+
+
+def proxy_delete(endpoint: str, params: dict = None, environment: str|None = None, project: Project|None = None):
+    """
+    Helper function to perform a DELETE request to the Pipedream API.
+    """
+    return proxy_request("DELETE", endpoint, params=params, environment=environment, project=project)
+
+
+def proxy_get_all(endpoint: str, params: dict = None, environment: str|None = None,
+                  project: Project|None = None) -> list:
+    """
+    Follow Pipedream's cursor pagination (page_info.end_cursor -> after) and
+    return the concatenated `data` arrays of every page.
+    """
+    params = dict(params or {})
+    items = []
+    while True:
+        page = proxy_get(endpoint, params=params, environment=environment, project=project) or {}
+        items.extend(page.get("data") or [])
+        cursor = (page.get("page_info") or {}).get("end_cursor")
+        if not cursor or not page.get("data"):
+            return items
+        params["after"] = cursor
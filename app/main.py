@@ -1,4 +1,6 @@
+import logging
 import uuid
+import anyio
 import requests
 from fastapi import FastAPI, HTTPException, Query, Request, Path
 from fastapi.responses import HTMLResponse, JSONResponse
@@ -9,8 +11,16 @@ from app.routers.webhooks import routes as webhook_routes
 from app.tools.gitlab import routes as gitlab_routes
 from app.tools.slack import routes as slack_routes
 
-from app.config import PIPEDREAM_API_HOST, OAUTH_TOKEN, PIPEDREAM_PROJECT_ID, PIPEDREAM_PROJECT_ENVIRONMENT, CLIENT_ID, CLIENT_SECRET, BASE_URL
-from app.helpers import encode_url, proxy_get
+from app.config import PIPEDREAM_API_HOST, OAUTH_TOKEN, PIPEDREAM_PROJECT_ID, PIPEDREAM_PROJECT_ENVIRONMENT, CLIENT_ID, CLIENT_SECRET, BASE_URL, ADMISSION_MAX_IN_FLIGHT
+from app.helpers import encode_url, proxy_get, proxy_post
+from app.projects import registry, get_current_project, project_middleware
+from app.triggers import project_trigger_index
+from app.projection import projection_middleware
+from app.compression import compression_middleware
+from app.fanout import dispatcher
+from app.scheduler import admission_middleware
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Pipedream REST API Proxy")
 templates = Jinja2Templates(directory="templates")
@@ -20,12 +30,49 @@ app.include_router(webhook_routes)
 app.include_router(gitlab_routes)
 app.include_router(slack_routes)
 
+# Middleware added last runs first: the project is selected first so admission
+# control can charge the request to it, and compression wraps the projected body.
+app.middleware("http")(projection_middleware)
+app.middleware("http")(compression_middleware)
+app.middleware("http")(admission_middleware)
+app.middleware("http")(project_middleware)
+
+@app.on_event("startup")
+def start_trigger_sync():
+    # Projects added to the registry later get their sync started as they are loaded.
+    registry.on_add(project_trigger_index)
+    registry.start()
+
+@app.on_event("startup")
+def size_threadpool():
+    # Sync routes wait for fair-queued upstream slots on worker threads, so the pool
+    # must be large enough to hold every admitted request.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = ADMISSION_MAX_IN_FLIGHT
+
+@app.on_event("shutdown")
+def close_fanout_sinks():
+    dispatcher.close()
+
+@app.on_event("shutdown")
+def close_projects():
+    registry.stop()
+    for project in registry.all():
+        project.close()
+
 @app.post("/webhook", response_class=HTMLResponse)
 async def webhook(request: Request):
-    print("--------------------------webhook got the trigger action--------------------------")
     x  = await request.json()
-    print(x)
-    return JSONResponse({"message": "Webhook triggered successfully!"})
+    logger.debug("Webhook received event: %s", x)
+    # Only enqueues on the matching sinks' bounded queues; delivery happens on their workers.
+    sinks = dispatcher.dispatch(x, request.headers)
+    return JSONResponse({"message": "Webhook triggered successfully!", "sinks": sinks})
+
+@app.get("/webhook/sinks")
+def webhook_sink_stats():
+    """
+    Queue depth, delivered and dead-lettered counts per fan-out sink.
+    """
+    return dispatcher.stats()
 
 @app.get("/", response_class=HTMLResponse)
 @app.get("/connect/{auth_type}", response_class=HTMLResponse)
@@ -37,11 +84,10 @@ async def connection_auth(request: Request,auth_type: str = None,oauth_client_id
         auth_type = "notion"
     return templates.TemplateResponse("connection.html", {"request": request, "oauthClientId": oauth_client_id,"auth_type": auth_type})
 
-async def server_connect_token_create(external_user_id: str):
+def server_connect_token_create(external_user_id: str):
     """
     Calls Pipedream's Connect API to generate a short-lived token for the given external user.
     """
-    url = f"{BASE_URL}/connect/{PIPEDREAM_PROJECT_ID}/tokens"
     payload = {
         "external_user_id": external_user_id,
         "allowed_origins": [
@@ -50,24 +96,16 @@ async def server_connect_token_create(external_user_id: str):
             "https://example.com"
         ]
     }
-    headers = {
-        "Authorization": f"Bearer {OAUTH_TOKEN}",
-        "Content-Type": "application/json",
-        "X-PD-Environment": PIPEDREAM_PROJECT_ENVIRONMENT
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
+    return proxy_post(f"/connect/{get_current_project().id}/tokens", json=payload)
 
 @app.get("/token")
-async def get_token():
+def get_token():
     """
     Generates and returns a Pipedream Connect token.
     """
     external_user_id = str(uuid.uuid4())
     try:
-        token_data = await server_connect_token_create(external_user_id)
+        token_data = server_connect_token_create(external_user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     return JSONResponse(token_data)
@@ -77,18 +115,16 @@ def generate_token():
     """
     Generate an OAuth access token using client credentials.
     """
-    token_url = f"{BASE_URL}/oauth/token"
-    payload = {
-        'grant_type': 'client_credentials',
-        'client_id': CLIENT_ID,
-        'client_secret': CLIENT_SECRET
-    }
-    response = requests.post(token_url, json=payload)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    token_data = response.json()
+    token_data = get_current_project().tokens.fetch()
     return {"access_token": token_data.get('access_token')}
 
+@app.get("/projects")
+def list_projects():
+    """
+    List the projects and environments served by this deployment.
+    """
+    return {"data": [project.describe() for project in registry.all()]}
+
 # --- Apps Endpoints ---
 @app.get("/apps")
 def list_apps(
@@ -127,7 +163,7 @@ def get_project_actions(
     Get list of actions for a specific app in a project.
     """
     params = {"app": app}
-    return proxy_get(f"/connect/{project_id}/actions", params=params, environment="development")
+    return proxy_get(f"/connect/{project_id}/actions", params=params)
 
 @app.get("/connect/{project_id}/components/{action_name}")
 def get_more_details_of_action(
@@ -138,7 +174,7 @@ def get_more_details_of_action(
     """
     Get more details of a specific action.
     """
-    return proxy_get(f"/connect/{project_id}/components/{action_name}", environment="development")
+    return proxy_get(f"/connect/{project_id}/components/{action_name}")
 #
 @app.post("/connect/{project_id}/components/{action_name}/run")
 def execute_action(
@@ -152,7 +188,7 @@ def execute_action(
     """
     Execute a specific action for a user.
     """
-    url = f"{BASE_URL}/connect/{project_id}/actions/run"
+    endpoint = f"/connect/{project_id}/actions/run"
     payload = {
         "external_user_id": "31b294c4-450f-446c-ad4d-c49178f577de",
         "id": "slack-send-message",
@@ -175,15 +211,7 @@ def execute_action(
         "mrkdwn": True,
         "as_user": False
     }
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OAUTH_TOKEN}",
-        "X-PD-Environment": "development"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
+    return proxy_post(endpoint, json=payload)
 
 @app.post("/send-slack", summary="Send a Slack message via Pipedream Connect Proxy")
 def send_slack_message(
@@ -0,0 +1,118 @@
+import json
+from functools import lru_cache
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+# Query parameter carrying the field mask, e.g. ?mask=data.id,data.name_slug,page_info
+MASK_PARAM = "mask"
+WILDCARD = "*"
+
+
+@lru_cache(maxsize=256)
+def compile_mask(mask: str) -> dict:
+    """
+    Compile a field mask into a nested dict tree. Paths are comma-separated and
+    dot-separated; `*` matches every key of an object. Lists are traversed
+    implicitly, so `data.name` selects `name` from every element of `data`.
+    A `None` subtree marks a leaf (keep the whole value). Wildcard subtrees are
+    merged into explicit sibling keys, so `*.id,data.name` keeps both `id` and
+    `name` of `data`. Compiled trees are cached per distinct mask.
+    """
+    tree = {}
+    for path in mask.split(","):
+        path = path.strip()
+        if not path:
+            continue
+        parts = path.split(".")
+        if any(not part for part in parts):
+            raise ValueError(f"Invalid field mask path: {path!r}")
+        node = tree
+        for index, part in enumerate(parts):
+            last = index == len(parts) - 1
+            if last:
+                node[part] = None
+            else:
+                child = node.get(part, {})
+                if child is None:
+                    # A shorter path already keeps the whole value.
+                    break
+                node[part] = child
+                node = child
+    if not tree:
+        raise ValueError("Field mask is empty")
+    return _fold_wildcards(tree)
+
+
+def _merge_trees(a: dict | None, b: dict | None) -> dict | None:
+    if a is None or b is None:
+        return None
+    merged = dict(a)
+    for key, subtree in b.items():
+        merged[key] = _merge_trees(merged[key], subtree) if key in merged else subtree
+    return merged
+
+
+def _fold_wildcards(tree: dict | None) -> dict | None:
+    """
+    Merge each `*` subtree into its explicit siblings, recursively.
+    """
+    if tree is None:
+        return None
+    tree = {key: _fold_wildcards(subtree) for key, subtree in tree.items()}
+    if WILDCARD in tree:
+        for key in tree:
+            if key != WILDCARD:
+                tree[key] = _fold_wildcards(_merge_trees(tree[key], tree[WILDCARD]))
+    return tree
+
+
+def project(value, tree: dict | None):
+    """
+    Apply a compiled field mask to a decoded JSON value.
+    """
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    wildcard = tree.get(WILDCARD, False)
+    for key, item in value.items():
+        if key in tree:
+            result[key] = project(item, tree[key])
+        elif wildcard is not False:
+            result[key] = project(item, wildcard)
+    return result
+
+
+def project_body(body: bytes, tree: dict) -> bytes:
+    """
+    Decode a JSON body, apply a compiled mask and re-encode it.
+    """
+    return json.dumps(project(json.loads(body), tree), separators=(",", ":")).encode()
+
+
+async def projection_middleware(request: Request, call_next):
+    """
+    Apply `?mask=` to successful JSON responses of every route. Bodies are decoded
+    and re-encoded on a worker thread so large documents never block the event loop.
+    """
+    mask = request.query_params.get(MASK_PARAM)
+    if not mask:
+        return await call_next(request)
+    try:
+        tree = compile_mask(mask)
+    except ValueError as err:
+        return JSONResponse({"detail": str(err)}, status_code=400)
+
+    response = await call_next(request)
+    if response.status_code != 200 or not response.headers.get("content-type", "").startswith("application/json"):
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {key: value for key, value in response.headers.items() if key.lower() != "content-length"}
+    projected = await run_in_threadpool(project_body, body, tree)
+    return Response(projected, status_code=response.status_code, headers=headers, media_type="application/json")
@@ -0,0 +1,330 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app import cassette
+from app.config import (
+    PIPEDREAM_PROJECT_ID, PIPEDREAM_PROJECT_ENVIRONMENT, OAUTH_TOKEN, CLIENT_ID, CLIENT_SECRET, BASE_URL,
+    TRIGGER_SYNC_USERS, PROJECTS_FILE, PROJECTS_RELOAD_INTERVAL, PROJECT_POOL_SIZE,
+)
+from app.scheduler import DEFAULT_TENANT, upstream_slot
+
+PROJECT_HEADER = "x-pd-project-id"
+ENVIRONMENT_HEADER = "x-pd-environment"
+# Routes that take the project in the path: /connect/{project_id}/... and /proxy/{project_id}/...
+PROJECT_PATH = re.compile(r"^/(?:connect|proxy)/(proj_[^/]+)/")
+# Refresh client-credentials tokens this many seconds before they expire.
+TOKEN_EXPIRY_MARGIN = 60
+
+logger = logging.getLogger(__name__)
+
+
+class TokenManager:
+    """
+    Supplies the bearer token of a project: a static OAuth token when one is
+    configured, otherwise a client-credentials token refreshed before it expires.
+    """
+
+    def __init__(self, session: requests.Session, oauth_token: str | None, client_id: str | None,
+                 client_secret: str | None):
+        self._session = session
+        self._static_token = oauth_token
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+
+    def fetch(self) -> dict:
+        """
+        Request a new client-credentials token. Goes through the upstream scheduler
+        and the cassette transport like every other Pipedream call.
+        """
+        if not (self._client_id and self._client_secret):
+            raise HTTPException(status_code=500, detail="Project has no OAuth token or client credentials")
+        payload = {
+            "grant_type": "client_credentials",
+            "client_id": self._client_id,
+            "client_secret": self._client_secret,
+        }
+        with upstream_slot():
+            response = cassette.send(self._session, "POST", f"{BASE_URL}/oauth/token",
+                                     {"Content-Type": "application/json"}, None, payload)
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.json()
+
+    def token(self) -> str:
+        if self._static_token:
+            return self._static_token
+        with self._lock:
+            if self._token is None or time.time() >= self._expires_at - TOKEN_EXPIRY_MARGIN:
+                token_data = self.fetch()
+                self._token = token_data["access_token"]
+                self._expires_at = time.time() + float(token_data.get("expires_in", 3600))
+            return self._token
+
+
+class Project:
+    """
+    One Pipedream project in one environment, with its own credentials,
+    connection pool and cache namespace.
+
+    `cache` is the namespace modules keep per-project state in (trigger index,
+    subscription index, ...), so projects never share or evict each other's entries.
+    `tenant` is the admission-control tenant its requests are charged to.
+
+    Requests hold the project between hold() and release(); a project removed
+    from the registry is retired and only closed once the last of them is done.
+    """
+
+    def __init__(self, project_id: str, environment: str, oauth_token: str | None = None,
+                 client_id: str | None = None, client_secret: str | None = None,
+                 pool_size: int = PROJECT_POOL_SIZE, trigger_sync_users: list | None = None,
+                 tenant: str | None = None):
+        self.id = project_id
+        self.environment = environment
+        self.tenant = tenant or f"{project_id}/{environment}"
+        self.trigger_sync_users = list(trigger_sync_users or [])
+        self.settings = (oauth_token, client_id, client_secret, pool_size, tuple(self.trigger_sync_users))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.tokens = TokenManager(self.session, oauth_token, client_id, client_secret)
+        self.cache = {}
+        self._cache_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._holders = 0
+        self._retired = False
+        self._closed = False
+
+    @property
+    def key(self) -> tuple:
+        return self.id, self.environment
+
+    def cached(self, name: str, factory):
+        """
+        Return the project's cache entry `name`, creating it with factory(project) on first use.
+        """
+        with self._cache_lock:
+            if name not in self.cache:
+                self.cache[name] = factory(self)
+            return self.cache[name]
+
+    def hold(self):
+        with self._state_lock:
+            self._holders += 1
+
+    def release(self):
+        with self._state_lock:
+            self._holders -= 1
+            close = self._retired and self._holders == 0
+        if close:
+            self.close()
+
+    def retire(self):
+        """
+        Close the project now if no request holds it, otherwise when the last one releases it.
+        """
+        with self._state_lock:
+            self._retired = True
+            close = self._holders == 0
+        if close:
+            self.close()
+
+    def close(self):
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+        for value in self.cache.values():
+            if hasattr(value, "stop"):
+                value.stop()
+        self.session.close()
+
+    def describe(self) -> dict:
+        return {"project_id": self.id, "environment": self.environment}
+
+
+def _default_project() -> Project:
+    # Requests that select no project use the deployment's own credentials and share its tenant.
+    return Project(PIPEDREAM_PROJECT_ID, PIPEDREAM_PROJECT_ENVIRONMENT, oauth_token=OAUTH_TOKEN,
+                   client_id=CLIENT_ID, client_secret=CLIENT_SECRET, trigger_sync_users=TRIGGER_SYNC_USERS,
+                   tenant=DEFAULT_TENANT)
+
+
+class ProjectRegistry:
+    """
+    Projects served by this deployment: the one from the environment variables plus
+    every entry of the PROJECTS_FILE JSON list, e.g.
+
+        [{"project_id": "proj_abc", "environment": "production",
+          "client_id": "...", "client_secret": "...", "pool_size": 20}]
+
+    A background thread re-reads the file when its modification time changes
+    (checked every PROJECTS_RELOAD_INTERVAL seconds), so projects can be added
+    without a redeploy and lookups never touch the disk.
+    Unchanged projects keep their connection pool, token and caches across reloads.
+    """
+
+    def __init__(self, path: str | None, reload_interval: float = PROJECTS_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        # Serialises reloads so concurrent callers never build the same projects twice.
+        self._reload_lock = threading.Lock()
+        self._default = _default_project()
+        self._projects = {self._default.key: self._default}
+        self._mtime = None
+        self._listeners = []
+        self._thread = None
+        self._stop = threading.Event()
+        self.reload()
+
+    def on_add(self, callback):
+        """
+        Call `callback(project)` for every current and future project.
+        """
+        self._listeners.append(callback)
+        for project in self.all():
+            callback(project)
+
+    def _load_file(self) -> list:
+        with open(self.path) as f:
+            entries = json.load(f)
+        projects = []
+        for entry in entries:
+            entry = dict(entry)
+            project_id = entry.pop("project_id")
+            environment = entry.pop("environment", "development")
+            projects.append(Project(project_id, environment, **entry))
+        return projects
+
+    def reload(self):
+        """
+        Re-read the projects file if it changed since the last load.
+        """
+        if not self.path:
+            return
+        with self._reload_lock:
+            self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            loaded = self._load_file()
+        except Exception as err:
+            logger.warning("Failed to load projects from %s: %s", self.path, err)
+            return
+
+        added, removed = [], []
+        with self._lock:
+            self._mtime = mtime
+            projects = {self._default.key: self._default}
+            for project in loaded:
+                current = self._projects.get(project.key)
+                if current is not None and current.settings == project.settings:
+                    project.session.close()
+                    project = current
+                else:
+                    added.append(project)
+                projects[project.key] = project
+            removed = [project for key, project in self._projects.items()
+                       if projects.get(key) is not project]
+            self._projects = projects
+        for project in removed:
+            # In-flight requests may still hold it through current_project.
+            project.retire()
+        for project in added:
+            for callback in self._listeners:
+                callback(project)
+
+    def _loop(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Project registry reload failed")
+
+    def start(self):
+        """
+        Start the background reload thread (idempotent).
+        """
+        if not self.path or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="project-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def all(self) -> list:
+        with self._lock:
+            return list(self._projects.values())
+
+    def get(self, project_id: str | None = None, environment: str | None = None, hold: bool = False) -> Project:
+        """
+        Look up a project; without an environment the first registered one wins.
+        Raises a 404 for projects that are not registered. With `hold`, the project
+        is held for the caller (see Project.hold) before a reload can retire it.
+        """
+        if project_id is None:
+            project_id = self._default.id
+        with self._lock:
+            if environment:
+                project = self._projects.get((project_id, environment))
+            else:
+                project = next((p for key, p in self._projects.items() if key[0] == project_id), None)
+            if project is not None and hold:
+                project.hold()
+        if project is None:
+            raise HTTPException(status_code=404, detail=f"Unknown project {project_id} ({environment or 'any environment'})")
+        return project
+
+
+registry = ProjectRegistry(PROJECTS_FILE)
+current_project = contextvars.ContextVar("current_project", default=None)
+
+
+def get_current_project() -> Project:
+    return current_project.get() or registry.get()
+
+
+def request_project(request: Request, hold: bool = False) -> Project:
+    match = PROJECT_PATH.match(request.url.path)
+    project_id = match.group(1) if match else request.headers.get(PROJECT_HEADER)
+    return registry.get(project_id, request.headers.get(ENVIRONMENT_HEADER), hold=hold)
+
+
+async def project_middleware(request: Request, call_next):
+    """
+    Select the project for the request from the path, X-PD-Project-Id and X-PD-Environment.
+    The project is also kept on `request.state` for admission control.
+    """
+    try:
+        project = request_project(request, hold=True)
+    except HTTPException as err:
+        return JSONResponse({"detail": err.detail}, status_code=err.status_code)
+    request.state.project = project
+    token = current_project.set(project)
+    try:
+        return await call_next(request)
+    finally:
+        current_project.reset(token)
+        project.release()
@@ -7,7 +7,7 @@ from app.helpers import proxy_get
 routes = APIRouter(tags=["Accounts"])
 
 @routes.get("/accounts", response_class=JSONResponse)
-async def get_accounts(
+def get_accounts(
         app: Optional[str] = Query(
             None,
             description=(
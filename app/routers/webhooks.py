@@ -1,24 +1,43 @@
 from fastapi import APIRouter, HTTPException, Query, Path
-from typing import Optional
+from typing import Optional, Dict, List
+from pydantic import BaseModel
 from fastapi.responses import JSONResponse
 from app.config import PIPEDREAM_API_HOST, OAUTH_TOKEN, PIPEDREAM_PROJECT_ID, PIPEDREAM_PROJECT_ENVIRONMENT, CLIENT_ID, CLIENT_SECRET, BASE_URL
 from app.helpers import proxy_get
-import requests
+from app.projects import get_current_project
+from app.subscriptions import project_subscription_manager
+from app.triggers import project_trigger_index
 
 routes = APIRouter(tags=["Webhooks"])
 
-# not working ...
+# Emitter from https://pipedream.com/sources/dc_76u1QxA, used when none is given.
+DEFAULT_EMITTER_ID = "dc_76u1QxA"
+DEFAULT_TENANT = "default"
+
 @routes.get("/deployed-triggers", summary="List all deployed triggers for a given user")
 def list_deployed_triggers(
         external_user_id: str = Query(...,
                                       description="The external user ID in your system on behalf of which you want to deploy the trigger.")
 ):
     """
-    List all deployed triggers for a given user.
+    List all deployed triggers for a given user, served from the local trigger index.
+    The user is tracked by the background sync from then on.
+    """
+    return {"data": project_trigger_index().for_user(external_user_id)}
+
+@routes.get("/deployed-triggers/by-app/{app}", summary="List indexed deployed triggers for an app")
+def list_deployed_triggers_by_app(app: str = Path(..., description="App name slug, e.g. slack")):
+    """
+    List deployed triggers of all tracked users for an app.
+    """
+    return {"data": project_trigger_index().for_app(app)}
+
+@routes.get("/deployed-triggers/by-component/{component}", summary="List indexed deployed triggers for a component")
+def list_deployed_triggers_by_component(component: str = Path(..., description="Component key or ID")):
+    """
+    List deployed triggers of all tracked users for a component.
     """
-    params = {"external_user_id": external_user_id}
-    endpoint = f"/connect/{PIPEDREAM_PROJECT_ID}/deployed-triggers"
-    return proxy_get(endpoint, params=params, environment="development")
+    return {"data": project_trigger_index().for_component(component)}
 
 @routes.get("/deployed-triggers/{deployed_component_id}/webhooks",summary="Retrieve webhooks listening to a deployed trigger")
 def retrieve_webhooks(
@@ -28,71 +47,66 @@ def retrieve_webhooks(
     ):
         """
         Retrieve the list of webhook URLs listening to a deployed trigger.
+        Served from the trigger index, falling back to the API for unindexed triggers.
         """
+        webhook_urls = project_trigger_index().webhook_urls(deployed_component_id, external_user_id)
+        if webhook_urls is not None:
+            return {"webhook_urls": webhook_urls}
+
         params = {}
         if external_user_id:
             params["external_user_id"] = external_user_id
 
-        endpoint = f"/connect/{PIPEDREAM_PROJECT_ID}/deployed-triggers/{deployed_component_id}/webhooks/"
-        return proxy_get(endpoint, params=params, environment="development")
+        endpoint = f"/connect/{get_current_project().id}/deployed-triggers/{deployed_component_id}/webhooks/"
+        return proxy_get(endpoint, params=params)
 
 @routes.post("/create-webhook", summary="Create a webhook and subscribe it to an emitter")
 def create_webhook(
         url: str = Query(..., description="The endpoint to which you’d like to deliver events."),
         name: str = Query(..., description="A name to assign to the webhook."),
-        description: str = Query(..., description="A longer description for the webhook.")
+        description: str = Query(..., description="A longer description for the webhook."),
+        emitter_id: str = Query(DEFAULT_EMITTER_ID, description="The emitter (event source) ID, e.g. dc_76u1QxA"),
+        tenant: str = Query(DEFAULT_TENANT, description="Tenant that owns the webhook.")
 ):
     """
-    Creates a webhook by calling the POST /webhooks endpoint and then creates a subscription
-    to deliver events from an emitter (hardcoded emitter ID) to this webhook.
+    Idempotently creates a webhook for `url` and subscribes it to the emitter.
 
-    Steps:
-      1. Create the webhook using the provided URL, name, and description.
-      2. Extract the webhook ID from the response.
-      3. Create a subscription using the emitter_id (from your event source) and the webhook ID.
+    Uses the subscription manager's local index, so retrying the request reuses the
+    existing webhook and subscription instead of creating duplicates.
     """
-    # Create the webhook
-    webhook_response = requests.post(
-        f"{BASE_URL}/webhooks",
-        params={
-            "url": url,
-            "name": name,
-            "description": description
-        },
-        headers={
-            "Authorization": f"Bearer {OAUTH_TOKEN}",
-            "Content-Type": "application/json"
-        }
-    )
-    if webhook_response.status_code != 200:
-        raise HTTPException(status_code=webhook_response.status_code, detail=webhook_response.text)
-
-    webhook_data = webhook_response.json()
-    listener_id = webhook_data.get("data",{}).get("id")
-    if not listener_id:
-        raise HTTPException(status_code=500, detail="Webhook creation did not return an ID")
+    try:
+        result = project_subscription_manager().ensure(tenant, emitter_id, url, name, description)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    except RuntimeError as err:
+        raise HTTPException(status_code=500, detail=str(err))
+    return JSONResponse(result)
 
-    # Hardcode the emitter_id from your event source (e.g., from https://pipedream.com/sources/dc_76u1QxA)
-    EMITTER_ID = "dc_76u1QxA"
 
-    # Create the subscription
-    subscription_response = requests.post(
-        f"{BASE_URL}/subscriptions",
-        params={
-            "emitter_id": EMITTER_ID,
-            "listener_id": listener_id
-        },
-        headers={
-            "Authorization": f"Bearer {OAUTH_TOKEN}",
-            "Content-Type": "application/json"
-        }
-    )
-    if subscription_response.status_code != 200:
-        raise HTTPException(status_code=subscription_response.status_code, detail=subscription_response.text)
+class SubscriptionReconcileRequest(BaseModel):
+    tenant: str
+    # emitter_id -> webhook URLs that should receive its events
+    subscriptions: Dict[str, List[str]]
+    description: str = ""
+    prune: bool = True
 
-    subscription_data = subscription_response.json()
 
-    return JSONResponse({
-        "webhook": webhook_data,
-        "subscription": subscription_data
-    })
\ No newline at end of file
+@routes.post("/webhooks/reconcile", summary="Reconcile a tenant's webhooks and subscriptions with a desired state")
+def reconcile_subscriptions(
+        body: SubscriptionReconcileRequest,
+        dry_run: bool = Query(False, description="Only return the planned writes."),
+        refresh: bool = Query(False, description="Re-list webhooks and subscriptions before planning.")
+):
+    """
+    Diff the tenant's desired emitter -> webhook subscriptions against the local index and
+    apply the missing creates and stale deletes concurrently. With `prune=false` nothing is deleted.
+    """
+    subscription_manager = project_subscription_manager()
+    try:
+        if dry_run:
+            subscription_manager.ensure_loaded(refresh)
+            return subscription_manager.plan(body.tenant, body.subscriptions, prune=body.prune)
+        return subscription_manager.reconcile(body.tenant, body.subscriptions, prune=body.prune,
+                                              description=body.description, force_refresh=refresh)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
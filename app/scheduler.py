@@ -0,0 +1,201 @@
+import contextvars
+import heapq
+import itertools
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app.config import (
+    UPSTREAM_MAX_CONCURRENCY, UPSTREAM_QUEUE_TIMEOUT, TENANT_MAX_IN_FLIGHT, TENANT_MAX_BATCH_IN_FLIGHT,
+    DEFAULT_TENANT_MAX_IN_FLIGHT, ADMISSION_MAX_IN_FLIGHT, TENANT_WEIGHTS, RETRY_AFTER_SECONDS,
+)
+
+# Tenant of requests served with the deployment's own (default) project.
+DEFAULT_TENANT = "default"
+# Flow used by background work (e.g. trigger sync) that runs outside any request.
+BACKGROUND_TENANT = "background"
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Interactive calls get a larger share of upstream capacity than batch action runs.
+CLASS_WEIGHTS = {INTERACTIVE: 4.0, BATCH: 1.0}
+MAX_TRACKED_FLOWS = 10000
+# Routes that never call Pipedream (webhook acks, HTML pages, docs) skip admission control.
+EXEMPT_PATHS = {"/", "/webhook", "/webhook/sinks", "/projects", "/docs", "/redoc", "/openapi.json"}
+EXEMPT_PATH = re.compile(r"^/connect/[^/]+$")
+# Bulk routes that are not action runs but fan out into many upstream calls.
+BATCH_PATHS = {"/webhooks/reconcile"}
+
+current_tenant = contextvars.ContextVar("current_tenant", default=DEFAULT_TENANT)
+current_class = contextvars.ContextVar("current_class", default=INTERACTIVE)
+
+
+def request_tenant(request: Request) -> str:
+    """
+    The tenant is the project the request was resolved to, i.e. the credentials its
+    upstream calls are made with, never something the client can claim in a header.
+    """
+    project = getattr(request.state, "project", None)
+    return project.tenant if project is not None else DEFAULT_TENANT
+
+
+def request_class(request: Request) -> str:
+    path = request.url.path
+    return BATCH if path.endswith("/run") or "/run/" in path or path in BATCH_PATHS else INTERACTIVE
+
+
+def is_exempt(request: Request) -> bool:
+    path = request.url.path
+    return path in EXEMPT_PATHS or bool(EXEMPT_PATH.match(path))
+
+
+def _overloaded(message: str) -> HTTPException:
+    return HTTPException(status_code=503, detail=message, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+
+class FairScheduler:
+    """
+    Start-time fair queuing of outbound Pipedream calls over a fixed number of slots.
+
+    Each (tenant, class) flow gets start tags spaced 1/weight apart, and free slots
+    are always granted to the waiter with the smallest start tag, so a tenant with a
+    deep backlog of batch calls cannot push other tenants' interactive calls back.
+    """
+
+    def __init__(self, capacity: int, queue_timeout: float):
+        self.capacity = capacity
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._in_use = 0
+        self._virtual_time = 0.0
+        self._finish_tags = {}
+        self._waiting = []
+        self._sequence = itertools.count()
+
+    @contextmanager
+    def slot(self, tenant: str, cls: str):
+        weight = CLASS_WEIGHTS.get(cls, 1.0) * TENANT_WEIGHTS.get(tenant, 1.0)
+        flow = (tenant, cls)
+        deadline = time.monotonic() + self.queue_timeout
+        with self._condition:
+            if len(self._finish_tags) > MAX_TRACKED_FLOWS:
+                # Flows whose last tag is behind virtual time carry no state worth keeping.
+                self._finish_tags = {key: tag for key, tag in self._finish_tags.items() if tag > self._virtual_time}
+            start = max(self._virtual_time, self._finish_tags.get(flow, 0.0))
+            self._finish_tags[flow] = start + 1.0 / weight
+            entry = (start, next(self._sequence))
+            heapq.heappush(self._waiting, entry)
+            while self._in_use >= self.capacity or self._waiting[0] != entry:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    # Give back the tag so a timed-out call does not penalise the flow.
+                    self._finish_tags[flow] -= 1.0 / weight
+                    self._condition.notify_all()
+                    raise _overloaded("Upstream capacity exhausted, retry later")
+                self._condition.wait(remaining)
+            heapq.heappop(self._waiting)
+            self._in_use += 1
+            self._virtual_time = max(self._virtual_time, start)
+            self._condition.notify_all()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify_all()
+
+
+class AdmissionController:
+    """
+    Caps in-flight requests per tenant with a separate budget per traffic class, so a
+    tenant's batch runs cannot use up its interactive slots. `tenant_limits` overrides
+    the budget of specific tenants for every class. Once the service as a whole is
+    busy, a tenant already holding at least its fair share of in-flight requests is
+    rejected too.
+    """
+
+    def __init__(self, class_limits: dict, total_limit: int, tenant_limits: dict | None = None):
+        self.class_limits = class_limits
+        self.total_limit = total_limit
+        self.tenant_limits = tenant_limits or {}
+        self._lock = threading.Lock()
+        # (tenant, class) -> in-flight count
+        self._in_flight = {}
+        # tenant -> in-flight count across classes
+        self._tenants = {}
+        self._total = 0
+
+    def try_acquire(self, tenant: str, cls: str = INTERACTIVE) -> bool:
+        flow = (tenant, cls)
+        with self._lock:
+            held = self._in_flight.get(flow, 0)
+            limit = self.tenant_limits.get(tenant) or self.class_limits.get(cls, self.class_limits[INTERACTIVE])
+            if held >= limit:
+                return False
+            tenant_held = self._tenants.get(tenant, 0)
+            if self._total >= self.total_limit:
+                fair_share = self.total_limit / max(len(self._tenants), 1)
+                if tenant_held >= fair_share:
+                    return False
+            self._in_flight[flow] = held + 1
+            self._tenants[tenant] = tenant_held + 1
+            self._total += 1
+            return True
+
+    def release(self, tenant: str, cls: str = INTERACTIVE):
+        flow = (tenant, cls)
+        with self._lock:
+            self._total -= 1
+            for counts, key in ((self._in_flight, flow), (self._tenants, tenant)):
+                held = counts.get(key, 0) - 1
+                if held > 0:
+                    counts[key] = held
+                else:
+                    counts.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"total": self._total, "tenants": dict(self._tenants)}
+
+
+scheduler = FairScheduler(UPSTREAM_MAX_CONCURRENCY, UPSTREAM_QUEUE_TIMEOUT)
+# Everything that selects no project shares the default tenant, so it gets its own, larger budget.
+admission = AdmissionController({INTERACTIVE: TENANT_MAX_IN_FLIGHT, BATCH: TENANT_MAX_BATCH_IN_FLIGHT},
+                                ADMISSION_MAX_IN_FLIGHT, {DEFAULT_TENANT: DEFAULT_TENANT_MAX_IN_FLIGHT})
+
+
+def upstream_slot():
+    """
+    Wait for a fair-queued upstream slot for the current request's tenant.
+    """
+    return scheduler.slot(current_tenant.get(), current_class.get())
+
+
+async def admission_middleware(request: Request, call_next):
+    """
+    Tag the request with its tenant and traffic class, and shed it with a quick
+    503 + Retry-After when the tenant is over its share.
+    """
+    if is_exempt(request):
+        return await call_next(request)
+    tenant = request_tenant(request)
+    cls = request_class(request)
+    if not admission.try_acquire(tenant, cls):
+        return JSONResponse(
+            {"detail": f"Tenant {tenant} is over its concurrency share, retry later"},
+            status_code=503,
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+    tenant_token = current_tenant.set(tenant)
+    class_token = current_class.set(cls)
+    try:
+        return await call_next(request)
+    finally:
+        current_class.reset(class_token)
+        current_tenant.reset(tenant_token)
+        admission.release(tenant, cls)
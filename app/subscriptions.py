@@ -0,0 +1,252 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from app.helpers import proxy_get_all, proxy_post, proxy_delete
+from app.projects import Project, get_current_project
+
+# Webhooks owned by a tenant are named "<tenant>:<name>" so that reconciling one
+# tenant never touches webhooks or subscriptions belonging to another.
+TENANT_SEPARATOR = ":"
+MAX_WORKERS = 16
+# Fixed number of locks that webhook and subscription keys are hashed onto.
+KEY_LOCK_STRIPES = 64
+
+
+class SubscriptionManager:
+    """
+    Keeps a local index of Pipedream webhooks and emitter subscriptions and
+    reconciles it against a desired state.
+
+    The index is filled by a single listing (GET /users/me/webhooks and
+    GET /users/me/subscriptions) and then kept up to date by every write made
+    through the manager, so a retried or repeated reconcile only issues the
+    writes that are still missing.
+    """
+
+    def __init__(self, project: Project, max_workers: int = MAX_WORKERS):
+        self.project = project
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="subscriptions")
+        self._loaded = False
+        # webhook id -> webhook document
+        self._webhooks = {}
+        # (tenant, url) -> webhook id
+        self._webhooks_by_key = {}
+        # set of (emitter_id, listener_id)
+        self._subscriptions = set()
+        # Serialise check-then-write per webhook (tenant, url) and per subscription; refresh() holds them all.
+        self._key_locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)]
+
+    @staticmethod
+    def _validate_tenant(tenant: str):
+        if not tenant or TENANT_SEPARATOR in tenant:
+            raise ValueError(f"Invalid tenant: {tenant!r}")
+
+    def _key_lock(self, key: tuple) -> threading.Lock:
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    @staticmethod
+    def _tenant_of(webhook: dict) -> str | None:
+        name = webhook.get("name") or ""
+        if TENANT_SEPARATOR not in name:
+            return None
+        return name.split(TENANT_SEPARATOR, 1)[0]
+
+    def _webhook_key(self, webhook: dict) -> tuple:
+        return self._tenant_of(webhook), webhook.get("url")
+
+    def _index_webhook(self, webhook: dict):
+        self._webhooks[webhook["id"]] = webhook
+        self._webhooks_by_key[self._webhook_key(webhook)] = webhook["id"]
+
+    def _unindex_webhook(self, webhook_id: str):
+        webhook = self._webhooks.pop(webhook_id, None)
+        if webhook:
+            self._webhooks_by_key.pop(self._webhook_key(webhook), None)
+
+    def refresh(self):
+        """
+        Rebuild the local index from the Pipedream API.
+
+        Every key lock is held while listing, so no write can land between the
+        listing and the swap, and the new index replaces the old one in one step
+        instead of being cleared while ensure() is reading it.
+        """
+        with ExitStack() as stack:
+            for lock in self._key_locks:
+                stack.enter_context(lock)
+            listed_webhooks = proxy_get_all("/users/me/webhooks", project=self.project)
+            listed_subscriptions = proxy_get_all("/users/me/subscriptions", project=self.project)
+            webhooks = {webhook["id"]: webhook for webhook in listed_webhooks}
+            webhooks_by_key = {self._webhook_key(webhook): webhook["id"] for webhook in listed_webhooks}
+            subscriptions = {
+                (sub.get("emitter_id"), sub.get("listener_id"))
+                for sub in listed_subscriptions
+                if sub.get("emitter_id") and sub.get("listener_id")
+            }
+            with self._lock:
+                self._webhooks, self._webhooks_by_key, self._subscriptions = webhooks, webhooks_by_key, subscriptions
+                self._loaded = True
+
+    def ensure_loaded(self, force_refresh: bool = False):
+        """
+        Fill the local index on first use, or re-list it when `force_refresh` is set.
+        """
+        if force_refresh or not self._loaded:
+            self.refresh()
+
+    def _create_webhook(self, tenant: str, url: str, name: str, description: str) -> str:
+        response = proxy_post("/webhooks", params={
+            "url": url,
+            "name": f"{tenant}{TENANT_SEPARATOR}{name}",
+            "description": description,
+        }, project=self.project) or {}
+        webhook = response.get("data") or {}
+        if not webhook.get("id"):
+            raise RuntimeError(f"Webhook creation for {url} did not return an ID")
+        webhook.setdefault("url", url)
+        webhook.setdefault("name", f"{tenant}{TENANT_SEPARATOR}{name}")
+        with self._lock:
+            self._index_webhook(webhook)
+        return webhook["id"]
+
+    def _ensure_webhook(self, tenant: str, url: str, name: str, description: str) -> str:
+        with self._key_lock(("webhook", tenant, url)):
+            with self._lock:
+                listener_id = self._webhooks_by_key.get((tenant, url))
+            if listener_id is None:
+                listener_id = self._create_webhook(tenant, url, name, description)
+            return listener_id
+
+    def _ensure_subscription(self, emitter_id: str, listener_id: str):
+        with self._key_lock(("subscription", emitter_id, listener_id)):
+            with self._lock:
+                subscribed = (emitter_id, listener_id) in self._subscriptions
+            if not subscribed:
+                self._create_subscription(emitter_id, listener_id)
+
+    def _delete_webhook(self, webhook_id: str):
+        with self._lock:
+            webhook = self._webhooks.get(webhook_id) or {}
+        with self._key_lock(("webhook", *self._webhook_key(webhook))):
+            proxy_delete(f"/webhooks/{webhook_id}", project=self.project)
+            with self._lock:
+                self._unindex_webhook(webhook_id)
+
+    def _create_subscription(self, emitter_id: str, listener_id: str):
+        proxy_post("/subscriptions", params={"emitter_id": emitter_id, "listener_id": listener_id},
+                   project=self.project)
+        with self._lock:
+            self._subscriptions.add((emitter_id, listener_id))
+
+    def _delete_subscription(self, emitter_id: str, listener_id: str):
+        with self._key_lock(("subscription", emitter_id, listener_id)):
+            proxy_delete("/subscriptions", params={"emitter_id": emitter_id, "listener_id": listener_id},
+                         project=self.project)
+            with self._lock:
+                self._subscriptions.discard((emitter_id, listener_id))
+
+    def _run(self, calls: list) -> list:
+        """
+        Run (fn, *args) tuples concurrently and return the errors as strings.
+        Each call runs in a copy of the caller's context so its upstream requests
+        are scheduled under the caller's tenant and traffic class.
+        """
+        futures = [self._executor.submit(contextvars.copy_context().run, fn, *args) for fn, *args in calls]
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as err:
+                errors.append(str(getattr(err, "detail", None) or err))
+        return errors
+
+    def plan(self, tenant: str, desired: dict[str, list[str]], prune: bool = True) -> dict:
+        """
+        Compute the writes needed to make the tenant's subscriptions match `desired`,
+        a mapping of emitter_id -> list of webhook URLs.
+        """
+        self._validate_tenant(tenant)
+        wanted_urls = {url for urls in desired.values() for url in urls}
+        with self._lock:
+            create_webhooks = sorted(url for url in wanted_urls if (tenant, url) not in self._webhooks_by_key)
+            create_subscriptions = []
+            for emitter_id, urls in desired.items():
+                for url in set(urls):
+                    listener_id = self._webhooks_by_key.get((tenant, url))
+                    if listener_id is None or (emitter_id, listener_id) not in self._subscriptions:
+                        create_subscriptions.append((emitter_id, url))
+
+            delete_subscriptions, delete_webhooks = [], []
+            if prune:
+                owned = {
+                    webhook_id: webhook.get("url")
+                    for webhook_id, webhook in self._webhooks.items()
+                    if self._tenant_of(webhook) == tenant
+                }
+                for emitter_id, listener_id in self._subscriptions:
+                    url = owned.get(listener_id)
+                    if url is not None and url not in desired.get(emitter_id, ()):
+                        delete_subscriptions.append((emitter_id, listener_id))
+                delete_webhooks = sorted(webhook_id for webhook_id, url in owned.items() if url not in wanted_urls)
+
+        return {
+            "create_webhooks": create_webhooks,
+            "create_subscriptions": sorted(create_subscriptions),
+            "delete_subscriptions": sorted(delete_subscriptions),
+            "delete_webhooks": delete_webhooks,
+        }
+
+    def reconcile(self, tenant: str, desired: dict[str, list[str]], prune: bool = True,
+                  description: str = "", force_refresh: bool = False) -> dict:
+        """
+        Apply the minimal set of creates and deletes so the tenant's subscriptions
+        match `desired`. Writes are issued concurrently in three dependent phases:
+        webhooks are created before the subscriptions that point at them, and are
+        only deleted once nothing subscribes to them anymore.
+        """
+        self._validate_tenant(tenant)
+        self.ensure_loaded(force_refresh)
+        plan = self.plan(tenant, desired, prune=prune)
+
+        errors = self._run([
+            (self._ensure_webhook, tenant, url, url, description) for url in plan["create_webhooks"]
+        ])
+
+        calls = []
+        with self._lock:
+            for emitter_id, url in plan["create_subscriptions"]:
+                listener_id = self._webhooks_by_key.get((tenant, url))
+                if listener_id is not None:
+                    calls.append((self._ensure_subscription, emitter_id, listener_id))
+        calls += [(self._delete_subscription, emitter_id, listener_id)
+                  for emitter_id, listener_id in plan["delete_subscriptions"]]
+        errors += self._run(calls)
+
+        errors += self._run([(self._delete_webhook, webhook_id) for webhook_id in plan["delete_webhooks"]])
+
+        return {"tenant": tenant, "plan": plan, "errors": errors}
+
+    def ensure(self, tenant: str, emitter_id: str, url: str, name: str, description: str = "") -> dict:
+        """
+        Idempotently make sure a webhook for `url` exists and is subscribed to `emitter_id`.
+        """
+        self._validate_tenant(tenant)
+        self.ensure_loaded()
+        listener_id = self._ensure_webhook(tenant, url, name, description)
+        self._ensure_subscription(emitter_id, listener_id)
+        with self._lock:
+            webhook = self._webhooks.get(listener_id)
+        return {"webhook": webhook, "subscription": {"emitter_id": emitter_id, "listener_id": listener_id}}
+
+    def stop(self):
+        self._executor.shutdown(wait=False)
+
+
+def project_subscription_manager(project: Project | None = None) -> SubscriptionManager:
+    """
+    The subscription manager kept in the cache namespace of `project` (default: the request's project).
+    """
+    return (project or get_current_project()).cached("subscriptions", SubscriptionManager)
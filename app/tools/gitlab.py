@@ -1,8 +1,7 @@
 
 from fastapi import APIRouter, HTTPException, Query, Path
 from app.config import PIPEDREAM_API_HOST, OAUTH_TOKEN, PIPEDREAM_PROJECT_ID, PIPEDREAM_PROJECT_ENVIRONMENT, CLIENT_ID, CLIENT_SECRET, BASE_URL
-from app.helpers import encode_url
-import requests
+from app.helpers import encode_url, proxy_get, proxy_post
 
 routes = APIRouter(tags=["GitLab"])
 
@@ -13,7 +12,7 @@ def execute_gitlab(
     """
     Execute a specific action for a user.
     """
-    url = f"{BASE_URL}/connect/{project_id}/actions/run"
+    endpoint = f"/connect/{project_id}/actions/run"
     payload = {
         "external_user_id": "xyz",
         "id": "gitlab-list-repo-branches",
@@ -25,15 +24,7 @@ def execute_gitlab(
         }
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OAUTH_TOKEN}",
-        "X-PD-Environment": "development"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
+    return proxy_post(endpoint, json=payload)
 
 @routes.post("/connect/{project_id}/components/{action_name}/run/notion")
 def execute_notion(
@@ -42,7 +33,7 @@ def execute_notion(
     """
     Execute a specific action for a user.
     """
-    url = f"{BASE_URL}/connect/{project_id}/actions/run"
+    endpoint = f"/connect/{project_id}/actions/run"
     payload = {
         "external_user_id": "e7a1120c-0aed-4aa3-b9d7-c335dca356c7",
         "id": "notion-search",
@@ -57,15 +48,7 @@ def execute_notion(
         }
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OAUTH_TOKEN}",
-        "X-PD-Environment": "development"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
+    return proxy_post(endpoint, json=payload)
 
 @routes.post("/proxy/{project_id}/send-gitlab", summary="Send a GitLab request via Pipedream Connect Proxy")
 def send_gitlab_request(
@@ -78,20 +61,11 @@ def send_gitlab_request(
     gitlab_api_url = f"https://gitlab.com/api/v4/projects/{gitlab_project_id}/repository/branches"
     encoded_url = encode_url(gitlab_api_url)
     
-    url = f"{BASE_URL}/connect/{project_id}/proxy/{encoded_url}"
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OAUTH_TOKEN}",
-        "X-PD-Environment": "development"
-    }
+    endpoint = f"/connect/{project_id}/proxy/{encoded_url}"
     
     params = {
         "external_user_id": external_user_id,
         "account_id": account_id
     }
     
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
+    return proxy_get(endpoint, params=params)
@@ -1,8 +1,7 @@
 
 from fastapi import APIRouter, HTTPException, Query, Path
 from app.config import PIPEDREAM_API_HOST, OAUTH_TOKEN, PIPEDREAM_PROJECT_ID, PIPEDREAM_PROJECT_ENVIRONMENT, CLIENT_ID, CLIENT_SECRET, BASE_URL
-from app.helpers import encode_url
-import requests
+from app.helpers import encode_url, proxy_post
 
 routes = APIRouter(tags=["Slack"])
 @routes.post("/connect/{project_id}/components/{action_name}/run/slack/list-channels")
@@ -14,7 +13,7 @@ def list_channels(
     """
     Execute a specific action for a user.
     """
-    url = f"{BASE_URL}/connect/{project_id}/actions/run"
+    endpoint = f"/connect/{project_id}/actions/run"
     payload = {
         "external_user_id": external_user_id,
         "id": "slack-list-channels",
@@ -25,15 +24,7 @@ def list_channels(
         }
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OAUTH_TOKEN}",
-        "X-PD-Environment": "development"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
+    return proxy_post(endpoint, json=payload)
 
 @routes.post("/connect/{project_id}/components/{action_name}/run/slack/send_message")
 def send_message(
@@ -44,7 +35,7 @@ def send_message(
     """
     Execute a specific action for a user.
     """
-    url = f"{BASE_URL}/connect/{project_id}/actions/run"
+    endpoint = f"/connect/{project_id}/actions/run"
     payload = {
         "external_user_id": external_user_id,
         "id": "slack-send-message",
@@ -65,15 +56,7 @@ def send_message(
             "configureUnfurlSettings": False
         }
     }
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OAUTH_TOKEN}",
-        "X-PD-Environment": "development"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
+    return proxy_post(endpoint, json=payload)
 @routes.post("/connect/{project_id}/components/{action_name}/run/slack/send_message/proxy")
 def send_message_proxy(
         project_id: str,
@@ -85,25 +68,16 @@ def send_message_proxy(
     """
     slack_url = "https://slack.com/api/chat.postMessage"
     encoded_url = encode_url(slack_url)
-    url = f"{BASE_URL}/connect/{project_id}/proxy/{encoded_url}"
+    endpoint = f"/connect/{project_id}/proxy/{encoded_url}"
     
     payload = {
         "text": "hi",
         "channel": "C0772SYKNN4"
     }
     
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OAUTH_TOKEN}",
-        "X-PD-Environment": "development"
-    }
-    
     params = {
         "external_user_id": external_user_id,
         "account_id": apn_key
     }
     
-    response = requests.post(url, json=payload, headers=headers, params=params)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
\ No newline at end of file
+    return proxy_post(endpoint, params=params, json=payload)
\ No newline at end of file
@@ -0,0 +1,261 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import TRIGGER_SYNC_INTERVAL, TRIGGER_SYNC_WORKERS, TRIGGER_MAX_QUERIED_USERS, TRIGGER_QUERIED_USER_TTL
+from app.helpers import proxy_get, proxy_get_all
+from app.projects import Project, get_current_project
+from app.scheduler import BACKGROUND_TENANT, BATCH, current_tenant, current_class
+
+logger = logging.getLogger(__name__)
+
+
+class TriggerIndex:
+    """
+    Local index of deployed triggers and the webhook URLs listening to them,
+    keyed by external user, component and app.
+
+    A background thread re-lists the deployed triggers of every tracked user, up to
+    `workers` users at a time. Only the webhook-URL fetches are incremental: the
+    trigger listing of each user is fully re-read on every sync, and webhook URLs are
+    re-fetched only for triggers that are new or whose `updated_at` changed, so each
+    sync costs one listing per user plus one call per changed trigger.
+    Queries are answered from the in-memory index in O(result).
+
+    Pinned users (TRIGGER_SYNC_USERS) are synced for the life of the index. Users
+    tracked only because a client queried them are dropped, with their triggers,
+    once they have not been queried for `queried_ttl` seconds, and beyond
+    `max_queried` of them the least recently queried user is dropped first.
+    """
+
+    def __init__(self, project: Project, interval: float = TRIGGER_SYNC_INTERVAL, workers: int = TRIGGER_SYNC_WORKERS,
+                 max_queried: int = TRIGGER_MAX_QUERIED_USERS, queried_ttl: float = TRIGGER_QUERIED_USER_TTL):
+        self.project = project
+        self.project_id = project.id
+        self.interval = interval
+        self.max_queried = max_queried
+        self.queried_ttl = queried_ttl
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="trigger-sync")
+        self._pinned = set()
+        # external user id -> last query time, least recently queried first
+        self._queried = OrderedDict()
+        self._synced_at = {}
+        # trigger id -> trigger document, plus "external_user_id" and "webhook_urls"
+        self._triggers = {}
+        self._by_user = {}
+        self._by_component = {}
+        self._by_app = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _component_of(trigger: dict) -> str | None:
+        return trigger.get("component_key") or trigger.get("component_id")
+
+    @staticmethod
+    def _app_of(trigger: dict) -> str | None:
+        # The connected app is the configured prop that carries an authProvisionId,
+        # e.g. {"slack": {"authProvisionId": "apn_..."}}.
+        for prop, value in (trigger.get("configured_props") or {}).items():
+            if isinstance(value, dict) and "authProvisionId" in value:
+                return prop
+        component = TriggerIndex._component_of(trigger) or ""
+        return component.split("-", 1)[0] or None
+
+    def _add(self, trigger: dict):
+        trigger_id = trigger["id"]
+        self._triggers[trigger_id] = trigger
+        self._by_user.setdefault(trigger["external_user_id"], set()).add(trigger_id)
+        for index, key in ((self._by_component, self._component_of(trigger)), (self._by_app, self._app_of(trigger))):
+            if key:
+                index.setdefault(key, set()).add(trigger_id)
+
+    def _remove(self, trigger_id: str):
+        trigger = self._triggers.pop(trigger_id, None)
+        if not trigger:
+            return
+        for index, key in ((self._by_user, trigger["external_user_id"]),
+                           (self._by_component, self._component_of(trigger)),
+                           (self._by_app, self._app_of(trigger))):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(trigger_id)
+                if not ids:
+                    del index[key]
+
+    def _fetch_webhook_urls(self, trigger_id: str, external_user_id: str) -> list:
+        response = proxy_get(
+            f"/connect/{self.project_id}/deployed-triggers/{trigger_id}/webhooks/",
+            params={"external_user_id": external_user_id},
+            project=self.project,
+        ) or {}
+        return response.get("webhook_urls") or []
+
+    def track(self, external_user_id: str):
+        """
+        Pin a user so it is synced for the life of the index.
+        """
+        with self._lock:
+            self._pinned.add(external_user_id)
+
+    def _is_tracked(self, external_user_id: str) -> bool:
+        return external_user_id in self._pinned or external_user_id in self._queried
+
+    def _forget(self, external_user_id: str):
+        self._synced_at.pop(external_user_id, None)
+        for trigger_id in list(self._by_user.get(external_user_id, ())):
+            self._remove(trigger_id)
+
+    def _expire_queried(self, now: float):
+        """
+        Drop queried users past their TTL or beyond the cap. Call with the lock held.
+        """
+        while self._queried:
+            external_user_id, queried_at = next(iter(self._queried.items()))
+            if len(self._queried) <= self.max_queried and now - queried_at < self.queried_ttl:
+                break
+            del self._queried[external_user_id]
+            if external_user_id not in self._pinned:
+                self._forget(external_user_id)
+
+    def sync_user(self, external_user_id: str):
+        """
+        Refresh the triggers of one user, re-fetching webhook URLs only for changed triggers.
+        """
+        listed = proxy_get_all(
+            f"/connect/{self.project_id}/deployed-triggers",
+            params={"external_user_id": external_user_id},
+            project=self.project,
+        )
+        with self._lock:
+            known = {trigger_id: self._triggers[trigger_id]
+                     for trigger_id in self._by_user.get(external_user_id, ())}
+
+        changed = []
+        for trigger in listed:
+            previous = known.get(trigger.get("id"))
+            if previous is None or previous.get("updated_at") != trigger.get("updated_at") or trigger.get("updated_at") is None:
+                changed.append(trigger)
+        webhook_urls = {trigger["id"]: self._fetch_webhook_urls(trigger["id"], external_user_id) for trigger in changed}
+
+        listed_ids = {trigger.get("id") for trigger in listed}
+        with self._lock:
+            if not self._is_tracked(external_user_id):
+                # Dropped while its listing was in flight.
+                return
+            for trigger_id in known.keys() - listed_ids:
+                self._remove(trigger_id)
+            for trigger in changed:
+                self._remove(trigger["id"])
+                self._add({**trigger, "external_user_id": external_user_id, "webhook_urls": webhook_urls[trigger["id"]]})
+            self._synced_at[external_user_id] = time.time()
+
+    def _sync_logged(self, external_user_id: str):
+        try:
+            self.sync_user(external_user_id)
+        except Exception as err:
+            logger.warning("Trigger sync failed for %s: %s", external_user_id, err)
+
+    def sync_all(self):
+        with self._lock:
+            if self._stop.is_set():
+                return
+            self._expire_queried(time.time())
+            # Workers run in a copy of this thread's context so their upstream calls keep its tenant and class.
+            futures = [self._executor.submit(contextvars.copy_context().run, self._sync_logged, external_user_id)
+                       for external_user_id in self._pinned | self._queried.keys()]
+        for future in futures:
+            future.result()
+
+    def _ensure_tracked(self, external_user_id: str):
+        """
+        Record that a user was queried, and sync it inline only the first time it
+        is seen; from then on the background thread keeps it fresh.
+        """
+        with self._lock:
+            now = time.time()
+            if external_user_id not in self._pinned:
+                self._queried[external_user_id] = now
+                self._queried.move_to_end(external_user_id)
+                self._expire_queried(now)
+            synced = external_user_id in self._synced_at
+        if not synced:
+            self.sync_user(external_user_id)
+
+    def _collect(self, ids) -> list:
+        return [self._triggers[trigger_id] for trigger_id in ids]
+
+    def for_user(self, external_user_id: str) -> list:
+        self._ensure_tracked(external_user_id)
+        with self._lock:
+            return self._collect(self._by_user.get(external_user_id, ()))
+
+    def for_component(self, component: str) -> list:
+        with self._lock:
+            return self._collect(self._by_component.get(component, ()))
+
+    def for_app(self, app: str) -> list:
+        with self._lock:
+            return self._collect(self._by_app.get(app, ()))
+
+    def webhook_urls(self, trigger_id: str, external_user_id: str | None = None) -> list | None:
+        """
+        Return the indexed webhook URLs of a trigger, or None if the trigger is unknown.
+        """
+        if external_user_id:
+            self._ensure_tracked(external_user_id)
+        with self._lock:
+            trigger = self._triggers.get(trigger_id)
+            if trigger is None or (external_user_id and trigger["external_user_id"] != external_user_id):
+                return None
+            return list(trigger["webhook_urls"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._pinned | self._queried.keys()),
+                "triggers": len(self._triggers),
+                "last_synced_at": max(self._synced_at.values(), default=None),
+            }
+
+    def _loop(self):
+        # Background syncs are their own batch flow rather than default interactive traffic.
+        current_tenant.set(BACKGROUND_TENANT)
+        current_class.set(BATCH)
+        while not self._stop.is_set():
+            self.sync_all()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """
+        Start the background sync thread (idempotent).
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="trigger-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stop.set()
+            self._executor.shutdown(wait=False)
+
+
+def _create_trigger_index(project: Project) -> TriggerIndex:
+    index = TriggerIndex(project)
+    for external_user_id in project.trigger_sync_users:
+        index.track(external_user_id)
+    index.start()
+    return index
+
+
+def project_trigger_index(project: Project | None = None) -> TriggerIndex:
+    """
+    The trigger index kept in the cache namespace of `project` (default: the request's project).
+    """
+    return (project or get_current_project()).cached("triggers", _create_trigger_index)
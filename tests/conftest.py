@@ -0,0 +1,4 @@
+import os
+
+# app.config refuses to import without an API token.
+os.environ.setdefault("PIPEDREAM_API_TOKEN", "test-token")
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+import requests
+from fastapi import HTTPException
+
+from app.cassette import CassettePlayer, CassetteRecorder
+
+
+class FakeSession:
+    def __init__(self, bodies=None):
+        self.calls = 0
+        self.bodies = bodies or {}
+
+    def request(self, method, url, headers=None, params=None, json=None):
+        self.calls += 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.bodies.get(url) or f'{{"url": "{url}", "call": {self.calls}}}'.encode()
+        response.headers["Content-Type"] = "application/json"
+        return response
+
+
+def record(path, *requests_args):
+    recorder = CassetteRecorder(str(path))
+    session = FakeSession()
+    for method, url, params, body in requests_args:
+        recorder.send(session, method, url, {"X-PD-Environment": "development"}, params, body)
+    recorder._file.close()
+
+
+def test_record_replay_round_trip(tmp_path):
+    path = tmp_path / "upstream.cassette"
+    record(path,
+           ("GET", "https://api/apps", {"limit": 1}, None),
+           ("GET", "https://api/apps", {"limit": 1}, None),
+           ("POST", "https://api/run", None, {"id": "x"}))
+
+    player = CassettePlayer(str(path), latency_scale=0)
+    headers = {"X-PD-Environment": "development", "Authorization": "Bearer other"}
+
+    assert player.size == 3
+    first = player.send(None, "GET", "https://api/apps", headers, {"limit": 1}, None)
+    second = player.send(None, "GET", "https://api/apps", headers, {"limit": 1}, None)
+    assert (first.json()["call"], second.json()["call"]) == (1, 2)
+    assert first.headers["Content-Type"] == "application/json"
+    assert player.send(None, "POST", "https://api/run", headers, None, {"id": "x"}).json()["call"] == 3
+
+
+def test_replay_miss_and_environment_are_part_of_the_key(tmp_path):
+    path = tmp_path / "upstream.cassette"
+    record(path, ("GET", "https://api/apps", None, None))
+    player = CassettePlayer(str(path), latency_scale=0)
+
+    with pytest.raises(HTTPException) as err:
+        player.send(None, "GET", "https://api/apps", {"X-PD-Environment": "production"}, None, None)
+    assert err.value.status_code == 502
+
+
+@pytest.mark.parametrize("cut", [1, 3, 10])
+def test_truncated_tail_keeps_complete_records(tmp_path, cut):
+    path = tmp_path / "upstream.cassette"
+    record(path, ("GET", "https://api/a", None, None), ("GET", "https://api/b", None, None))
+    data = path.read_bytes()
+    path.write_bytes(data[:-cut])
+
+    player = CassettePlayer(str(path), latency_scale=0)
+
+    assert player.size == 1
+    response = player.send(None, "GET", "https://api/a", {"X-PD-Environment": "development"}, None, None)
+    assert json.loads(response.content)["url"] == "https://api/a"
+
+
+def test_credentials_are_redacted_before_recording(tmp_path):
+    path = tmp_path / "upstream.cassette"
+    bodies = {
+        "https://api/oauth/token": {"access_token": "secret-oauth", "expires_in": 3600},
+        "https://api/connect/proj_1/tokens": {"token": "ctok_secret", "connect_link_url": "https://x?token=ctok_secret",
+                                              "expires_at": "2026-01-01"},
+        "https://api/accounts": {"data": [{"id": "apn_1", "credentials": {"oauth_access_token": "secret-account"}}]},
+    }
+    recorder = CassetteRecorder(str(path))
+    session = FakeSession({url: json.dumps(body).encode() for url, body in bodies.items()})
+    for url in bodies:
+        recorder.send(session, "GET", url, {}, None, None)
+    recorder._file.close()
+
+    assert b"secret" not in path.read_bytes()
+    player = CassettePlayer(str(path), latency_scale=0)
+    token = player.send(None, "GET", "https://api/oauth/token", {}, None, None).json()
+    assert token == {"access_token": "[redacted]", "expires_in": 3600}
+    accounts = player.send(None, "GET", "https://api/accounts", {}, None, None).json()
+    assert accounts["data"][0] == {"id": "apn_1", "credentials": "[redacted]"}
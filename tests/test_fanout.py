@@ -0,0 +1,110 @@
+import json
+import threading
+
+from app.fanout import FanoutDispatcher, Sink
+
+
+class RecordingSink(Sink):
+    def __init__(self, name, fail=False, release=None, **options):
+        self.batches = []
+        self.fail = fail
+        self.release = release
+        self.started = threading.Event()
+        super().__init__(name, **options)
+
+    def send(self, batch):
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        if self.fail:
+            raise Exception("sink down")
+        self.batches.append(list(batch))
+
+
+def make_sink(tmp_path, **options):
+    options.setdefault("flush_interval", 0.05)
+    options.setdefault("backoff", 0)
+    return RecordingSink("test", dead_letter=str(tmp_path / "dead.jsonl"), **options)
+
+
+def dead_letters(tmp_path):
+    path = tmp_path / "dead.jsonl"
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_events_are_delivered_in_batches(tmp_path):
+    sink = make_sink(tmp_path, batch_size=2, flush_interval=0.5)
+    for number in range(3):
+        assert sink.enqueue({"n": number})
+    sink.close()
+
+    assert [event["n"] for batch in sink.batches for event in batch] == [0, 1, 2]
+    assert max(len(batch) for batch in sink.batches) == 2
+    assert sink.stats() == {"queued": 0, "sent": 3, "dead_lettered": 0}
+
+
+def test_failed_batch_is_dead_lettered_after_retries(tmp_path):
+    sink = make_sink(tmp_path, fail=True, max_retries=2)
+    sink.enqueue({"n": 1})
+    sink.close()
+
+    assert [(entry["reason"], entry["event"]) for entry in dead_letters(tmp_path)] == [("sink down", {"n": 1})]
+    assert sink.stats()["dead_lettered"] == 1
+
+
+def test_full_queue_dead_letters_instead_of_blocking(tmp_path):
+    release = threading.Event()
+    sink = make_sink(tmp_path, queue_size=1, batch_size=1, release=release)
+    sink.enqueue({"n": 1})
+    sink.started.wait(1)
+    assert sink.enqueue({"n": 2})
+    assert not sink.enqueue({"n": 3})
+    release.set()
+    sink.close()
+
+    assert [(entry["reason"], entry["event"]) for entry in dead_letters(tmp_path)] == [("queue full", {"n": 3})]
+    assert sink.stats()["sent"] == 2
+
+
+def test_close_dead_letters_batch_still_being_sent(tmp_path):
+    release = threading.Event()
+    sink = make_sink(tmp_path, fail=True, max_retries=0, release=release, shutdown_timeout=0.1)
+    sink.enqueue({"n": 1})
+    sink.started.wait(1)
+
+    sink.close()
+    assert [(entry["reason"], entry["event"]) for entry in dead_letters(tmp_path)] == [("shutdown", {"n": 1})]
+
+    # The late failure must not write the batch a second time or lose it.
+    release.set()
+    sink._thread.join(1)
+    assert not sink._thread.is_alive()
+    assert len(dead_letters(tmp_path)) == 1
+    assert sink.stats() == {"queued": 0, "sent": 0, "dead_lettered": 1}
+
+
+def test_events_after_close_are_dead_lettered(tmp_path):
+    sink = make_sink(tmp_path)
+    sink.close()
+
+    assert not sink.enqueue({"n": 1})
+    assert [(entry["reason"], entry["event"]) for entry in dead_letters(tmp_path)] == [("shutdown", {"n": 1})]
+
+
+def test_dispatcher_routes_by_source_and_type(tmp_path):
+    sinks = {"all": make_sink(tmp_path), "slack": make_sink(tmp_path)}
+    dispatcher = FanoutDispatcher(sinks, [
+        {"match": {}, "sinks": ["all"]},
+        {"match": {"source": "dc_*", "type": "message"}, "sinks": ["slack", "all"]},
+    ])
+
+    assert dispatcher.dispatch({"type": "message"}, {"x-pd-emitter-id": "dc_1"}) == ["all", "slack"]
+    assert dispatcher.dispatch({"type": "reaction"}, {"x-pd-emitter-id": "dc_1"}) == ["all"]
+    dispatcher.close()
+
+    assert dispatcher.stats() == {
+        "all": {"queued": 0, "sent": 2, "dead_lettered": 0},
+        "slack": {"queued": 0, "sent": 1, "dead_lettered": 0},
+    }
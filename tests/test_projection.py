@@ -0,0 +1,82 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.compression import compression_middleware, negotiate_encoding
+from app.projection import compile_mask, project, projection_middleware
+
+
+def test_compile_mask_builds_nested_tree():
+    assert compile_mask("data.id,data.name_slug,page_info") == {
+        "data": {"id": None, "name_slug": None},
+        "page_info": None,
+    }
+
+
+def test_shorter_path_keeps_whole_value():
+    assert compile_mask("data,data.id") == {"data": None}
+    assert compile_mask("data.id,data") == {"data": None}
+
+
+def test_wildcard_subtree_is_merged_into_explicit_keys():
+    tree = compile_mask("*.id,data.name")
+    assert tree == {"*": {"id": None}, "data": {"id": None, "name": None}}
+
+    document = {"data": {"id": 1, "name": "a", "other": 2}, "meta": {"id": 3, "x": 4}}
+    assert project(document, tree) == {"data": {"id": 1, "name": "a"}, "meta": {"id": 3}}
+
+
+@pytest.mark.parametrize("mask", ["", " , ", "data..id", ".id"])
+def test_invalid_masks_are_rejected(mask):
+    with pytest.raises(ValueError):
+        compile_mask(mask)
+
+
+def test_project_traverses_lists_and_keeps_scalars():
+    document = {"data": [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}], "page_info": {"count": 2}}
+    assert project(document, compile_mask("data.id,page_info.count")) == {
+        "data": [{"id": 1}, {"id": 2}],
+        "page_info": {"count": 2},
+    }
+    assert project([1, "x"], compile_mask("id")) == [1, "x"]
+
+
+def test_negotiate_encoding_respects_quality():
+    assert negotiate_encoding("gzip") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("*") is not None
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/components")
+    def components():
+        return {"data": [{"key": f"component-{n}", "description": "x" * 100} for n in range(50)]}
+
+    app.middleware("http")(projection_middleware)
+    app.middleware("http")(compression_middleware)
+    return TestClient(app)
+
+
+def test_middleware_projects_then_compresses(client):
+    response = client.get("/components", params={"mask": "data.key"}, headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == {"data": [{"key": f"component-{n}"} for n in range(50)]}
+
+
+def test_small_body_is_not_compressed(client):
+    response = client.get("/components", params={"mask": "data.missing"}, headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"data": [{}] * 50}
+
+
+def test_invalid_mask_is_a_bad_request(client):
+    response = client.get("/components", params={"mask": "data..key"})
+
+    assert response.status_code == 400
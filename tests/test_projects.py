@@ -0,0 +1,101 @@
+import json
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app import projects
+from app.projects import ProjectRegistry, get_current_project, project_middleware
+
+
+def write_projects(path, entries, mtime):
+    path.write_text(json.dumps(entries))
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def projects_file(tmp_path):
+    path = tmp_path / "projects.json"
+    write_projects(path, [
+        {"project_id": "proj_a", "environment": "development", "oauth_token": "a-dev"},
+        {"project_id": "proj_a", "environment": "production", "oauth_token": "a-prod"},
+        {"project_id": "proj_b", "environment": "production", "oauth_token": "b"},
+    ], mtime=1000)
+    return path
+
+
+@pytest.fixture
+def registry(projects_file, monkeypatch):
+    registry = ProjectRegistry(str(projects_file))
+    monkeypatch.setattr(projects, "registry", registry)
+    return registry
+
+
+@pytest.fixture
+def client(registry):
+    app = FastAPI()
+
+    @app.get("/apps")
+    @app.get("/connect/{project_id}/actions")
+    def describe(project_id: str | None = None):
+        return get_current_project().describe()
+
+    app.middleware("http")(project_middleware)
+    return TestClient(app)
+
+
+def test_project_from_path_wins_over_header(client, registry):
+    response = client.get("/connect/proj_b/actions", headers={"X-PD-Project-Id": "proj_a"})
+
+    assert response.json() == {"project_id": "proj_b", "environment": "production"}
+    assert registry.get("proj_b")._holders == 0
+
+
+def test_project_and_environment_from_headers(client):
+    response = client.get("/apps", headers={"X-PD-Project-Id": "proj_a", "X-PD-Environment": "production"})
+    assert response.json() == {"project_id": "proj_a", "environment": "production"}
+
+    response = client.get("/apps", headers={"X-PD-Project-Id": "proj_a"})
+    assert response.json() == {"project_id": "proj_a", "environment": "development"}
+
+
+def test_request_without_project_uses_default(client, registry):
+    assert client.get("/apps").json() == registry._default.describe()
+
+
+@pytest.mark.parametrize("headers", [{"X-PD-Project-Id": "proj_missing"},
+                                     {"X-PD-Project-Id": "proj_b", "X-PD-Environment": "development"}])
+def test_unknown_project_is_404(client, headers):
+    assert client.get("/apps", headers=headers).status_code == 404
+
+
+def test_reload_keeps_unchanged_projects_and_replaces_changed_ones(registry, projects_file):
+    unchanged = registry.get("proj_a", "development")
+    changed = registry.get("proj_a", "production")
+    removed = registry.get("proj_b")
+    unchanged.cache["triggers"] = "index"
+
+    write_projects(projects_file, [
+        {"project_id": "proj_a", "environment": "development", "oauth_token": "a-dev"},
+        {"project_id": "proj_a", "environment": "production", "oauth_token": "a-prod-rotated"},
+    ], mtime=2000)
+    registry.reload()
+
+    assert registry.get("proj_a", "development") is unchanged
+    assert unchanged.cache == {"triggers": "index"} and not unchanged._closed
+    assert registry.get("proj_a", "production") is not changed
+    assert changed._closed and removed._closed
+    with pytest.raises(HTTPException):
+        registry.get("proj_b")
+
+
+def test_removed_project_closes_only_after_in_flight_requests(registry, projects_file):
+    held = registry.get("proj_b", hold=True)
+
+    write_projects(projects_file, [], mtime=2000)
+    registry.reload()
+
+    assert not held._closed
+    held.release()
+    assert held._closed
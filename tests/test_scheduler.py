@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from starlette.requests import Request
+
+from app import projects, scheduler
+from app.projects import Project, ProjectRegistry, project_middleware
+from app.scheduler import (
+    AdmissionController, FairScheduler, BATCH, DEFAULT_TENANT, INTERACTIVE, admission_middleware, is_exempt,
+    request_class,
+)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for condition"
+        time.sleep(0.001)
+
+
+def make_request(path):
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": []})
+
+
+def test_fair_scheduler_interleaves_interactive_ahead_of_batch_backlog():
+    scheduler = FairScheduler(capacity=1, queue_timeout=5)
+    order = []
+
+    def job(tenant, cls):
+        with scheduler.slot(tenant, cls):
+            order.append(tenant)
+
+    holder = scheduler.slot("holder", INTERACTIVE)
+    holder.__enter__()
+    threads = []
+    for tenant, cls in [("big", BATCH)] * 3 + [("small", INTERACTIVE)] * 2:
+        thread = threading.Thread(target=job, args=(tenant, cls))
+        waiting = len(scheduler._waiting)
+        thread.start()
+        wait_for(lambda: len(scheduler._waiting) == waiting + 1)
+        threads.append(thread)
+    holder.__exit__(None, None, None)
+    for thread in threads:
+        thread.join()
+
+    # Start tags: big 0, 1, 2 (weight 1); small 0, 0.25 (weight 4).
+    assert order == ["big", "small", "small", "big", "big"]
+
+
+def test_fair_scheduler_times_out_with_retry_after():
+    scheduler = FairScheduler(capacity=1, queue_timeout=0.05)
+    with scheduler.slot("a", INTERACTIVE):
+        with pytest.raises(HTTPException) as err:
+            with scheduler.slot("b", INTERACTIVE):
+                pass
+    assert err.value.status_code == 503
+    assert "Retry-After" in err.value.headers
+    assert scheduler._waiting == []
+    with scheduler.slot("b", INTERACTIVE):
+        pass
+
+
+def test_admission_budgets_classes_separately():
+    admission = AdmissionController({INTERACTIVE: 2, BATCH: 1}, total_limit=100)
+
+    assert admission.try_acquire("t", BATCH)
+    assert not admission.try_acquire("t", BATCH)
+    assert admission.try_acquire("t", INTERACTIVE)
+    assert admission.try_acquire("t", INTERACTIVE)
+    assert not admission.try_acquire("t", INTERACTIVE)
+
+    admission.release("t", BATCH)
+    assert admission.try_acquire("t", BATCH)
+
+
+def test_admission_sheds_tenant_over_fair_share_when_saturated():
+    admission = AdmissionController({INTERACTIVE: 10, BATCH: 10}, total_limit=4)
+    for _ in range(4):
+        assert admission.try_acquire("noisy")
+
+    # Saturated: a quiet tenant is still admitted, the noisy one is shed.
+    assert admission.try_acquire("quiet")
+    assert not admission.try_acquire("noisy")
+    assert admission.stats() == {"total": 5, "tenants": {"noisy": 4, "quiet": 1}}
+
+
+def test_webhook_ack_is_exempt_from_admission():
+    assert is_exempt(make_request("/webhook"))
+    assert is_exempt(make_request("/connect/notion"))
+    assert not is_exempt(make_request("/apps"))
+    assert not is_exempt(make_request("/connect/proj_1/actions/gitlab"))
+
+
+def test_request_class():
+    assert request_class(make_request("/connect/proj_1/components/x/run")) == BATCH
+    assert request_class(make_request("/connect/proj_1/components/x/run/slack/list-channels")) == BATCH
+    assert request_class(make_request("/webhooks/reconcile")) == BATCH
+    assert request_class(make_request("/accounts")) == INTERACTIVE
+
+
+def test_tenant_limit_overrides_class_budget():
+    admission = AdmissionController({INTERACTIVE: 1, BATCH: 1}, total_limit=100, tenant_limits={DEFAULT_TENANT: 3})
+
+    assert all(admission.try_acquire(DEFAULT_TENANT) for _ in range(3))
+    assert not admission.try_acquire(DEFAULT_TENANT)
+    assert admission.try_acquire("proj_a/production")
+    assert not admission.try_acquire("proj_a/production")
+
+
+@pytest.fixture
+def admission_app(monkeypatch):
+    registry = ProjectRegistry(None)
+    other = Project("proj_other", "production")
+    registry._projects[other.key] = other
+    monkeypatch.setattr(projects, "registry", registry)
+    monkeypatch.setattr(scheduler, "admission", AdmissionController(
+        {INTERACTIVE: 2, BATCH: 1}, total_limit=64, tenant_limits={DEFAULT_TENANT: 64}))
+
+    app = FastAPI()
+
+    @app.get("/apps")
+    def slow_upstream():
+        time.sleep(0.2)
+        return {"tenant": scheduler.current_tenant.get()}
+
+    # Same order as app.main: project selection runs before admission control.
+    app.middleware("http")(admission_middleware)
+    app.middleware("http")(project_middleware)
+    return app
+
+
+def run_concurrently(app, count, headers=None):
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.get("/apps", headers=headers) for _ in range(count)))
+
+    return asyncio.run(main())
+
+
+def test_concurrent_anonymous_requests_share_the_large_default_budget(admission_app):
+    responses = run_concurrently(admission_app, 12)
+
+    assert [response.status_code for response in responses] == [200] * 12
+    assert {response.json()["tenant"] for response in responses} == {DEFAULT_TENANT}
+
+
+def test_project_tenant_is_capped_and_header_cannot_pick_tenant(admission_app):
+    responses = run_concurrently(admission_app, 4, headers={"X-PD-Project-Id": "proj_other", "X-Tenant-ID": "x"})
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 200, 503, 503]
+    assert all("Retry-After" in response.headers for response in responses if response.status_code == 503)
+    assert {response.json()["tenant"] for response in responses if response.status_code == 200} == \
+        {"proj_other/production"}
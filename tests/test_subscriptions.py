@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+from app import subscriptions
+from app.subscriptions import SubscriptionManager
+
+
+def make_manager(webhooks=(), subs=()):
+    manager = SubscriptionManager(project=None)
+    for webhook in webhooks:
+        manager._index_webhook(webhook)
+    manager._subscriptions = set(subs)
+    manager._loaded = True
+    return manager
+
+
+def test_plan_creates_missing_and_prunes_only_owned():
+    manager = make_manager(
+        webhooks=[
+            {"id": "hook_1", "name": "acme:https://a", "url": "https://a"},
+            {"id": "hook_2", "name": "acme:https://old", "url": "https://old"},
+            {"id": "hook_3", "name": "other:https://a", "url": "https://a"},
+        ],
+        subs=[("dc_1", "hook_1"), ("dc_1", "hook_2"), ("dc_2", "hook_3")],
+    )
+
+    plan = manager.plan("acme", {"dc_1": ["https://a"], "dc_2": ["https://a", "https://b"]})
+
+    assert plan == {
+        "create_webhooks": ["https://b"],
+        "create_subscriptions": [("dc_2", "https://a"), ("dc_2", "https://b")],
+        "delete_subscriptions": [("dc_1", "hook_2")],
+        "delete_webhooks": ["hook_2"],
+    }
+
+
+def test_plan_without_prune_never_deletes():
+    manager = make_manager(
+        webhooks=[{"id": "hook_1", "name": "acme:https://old", "url": "https://old"}],
+        subs=[("dc_1", "hook_1")],
+    )
+
+    plan = manager.plan("acme", {}, prune=False)
+
+    assert plan["delete_subscriptions"] == [] and plan["delete_webhooks"] == []
+
+
+def test_plan_of_converged_state_is_empty():
+    manager = make_manager(
+        webhooks=[{"id": "hook_1", "name": "acme:https://a", "url": "https://a"}],
+        subs=[("dc_1", "hook_1")],
+    )
+
+    plan = manager.plan("acme", {"dc_1": ["https://a"]})
+
+    assert not any(plan.values())
+
+
+@pytest.mark.parametrize("tenant", ["", "a:b"])
+def test_invalid_tenant_is_rejected(tenant):
+    manager = make_manager()
+    with pytest.raises(ValueError):
+        manager.plan(tenant, {})
+    with pytest.raises(ValueError):
+        manager.ensure(tenant, "dc_1", "https://a", "a")
+
+
+def test_concurrent_ensure_creates_once(monkeypatch):
+    calls = []
+
+    def fake_post(endpoint, params=None, json=None, environment=None, project=None):
+        calls.append(endpoint)
+        time.sleep(0.05)
+        if endpoint == "/webhooks":
+            return {"data": {"id": f"hook_{len(calls)}"}}
+        return {}
+
+    monkeypatch.setattr(subscriptions, "proxy_post", fake_post)
+    manager = make_manager()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(manager.ensure("acme", "dc_1", "https://a", "a")))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["/webhooks", "/subscriptions"]
+    assert {result["subscription"]["listener_id"] for result in results} == {"hook_1"}
+
+
+def test_ensure_during_refresh_does_not_create_duplicates(monkeypatch):
+    calls = []
+    listing = threading.Event()
+
+    def fake_get_all(endpoint, params=None, project=None):
+        # The listing is a snapshot taken before any webhook exists.
+        listing.set()
+        time.sleep(0.1)
+        return []
+
+    def fake_post(endpoint, params=None, json=None, environment=None, project=None):
+        calls.append(endpoint)
+        return {"data": {"id": "hook_1"}} if endpoint == "/webhooks" else {}
+
+    monkeypatch.setattr(subscriptions, "proxy_get_all", fake_get_all)
+    monkeypatch.setattr(subscriptions, "proxy_post", fake_post)
+    manager = make_manager()
+    refresh = threading.Thread(target=manager.refresh)
+    refresh.start()
+    listing.wait(1)
+
+    manager.ensure("acme", "dc_1", "https://a", "a")
+    refresh.join()
+    manager.ensure("acme", "dc_1", "https://a", "a")
+
+    assert calls == ["/webhooks", "/subscriptions"]
+    assert len(manager._key_locks) == subscriptions.KEY_LOCK_STRIPES
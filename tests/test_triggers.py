@@ -0,0 +1,99 @@
+import pytest
+
+from app import triggers
+from app.projects import Project
+from app.triggers import TriggerIndex
+
+
+class FakeUpstream:
+    def __init__(self):
+        # external user id -> list of trigger documents
+        self.listings = {}
+        self.webhook_fetches = []
+
+    def get_all(self, endpoint, params=None, project=None):
+        return [dict(trigger) for trigger in self.listings.get(params["external_user_id"], [])]
+
+    def get(self, endpoint, params=None, project=None):
+        trigger_id = endpoint.rstrip("/").split("/")[-2]
+        self.webhook_fetches.append(trigger_id)
+        return {"webhook_urls": [f"https://hooks/{trigger_id}"]}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = FakeUpstream()
+    monkeypatch.setattr(triggers, "proxy_get_all", fake.get_all)
+    monkeypatch.setattr(triggers, "proxy_get", fake.get)
+    return fake
+
+
+def trigger(trigger_id, updated_at, component="slack-new-message"):
+    return {"id": trigger_id, "updated_at": updated_at, "component_key": component,
+            "configured_props": {"slack": {"authProvisionId": "apn_1"}}}
+
+
+def make_index(**options):
+    return TriggerIndex(Project("proj_t", "development"), **options)
+
+
+def test_sync_only_refetches_webhooks_of_changed_triggers(upstream):
+    index = make_index()
+    upstream.listings["u1"] = [trigger("dc_1", 1), trigger("dc_2", 1)]
+    assert {t["id"] for t in index.for_user("u1")} == {"dc_1", "dc_2"}
+    assert sorted(upstream.webhook_fetches) == ["dc_1", "dc_2"]
+
+    upstream.webhook_fetches.clear()
+    upstream.listings["u1"] = [trigger("dc_1", 1), trigger("dc_2", 2, component="gitlab-new-commit"),
+                               trigger("dc_3", 1)]
+    index.sync_all()
+
+    assert sorted(upstream.webhook_fetches) == ["dc_2", "dc_3"]
+    assert {t["id"] for t in index.for_component("gitlab-new-commit")} == {"dc_2"}
+    assert {t["id"] for t in index.for_component("slack-new-message")} == {"dc_1", "dc_3"}
+    assert index.webhook_urls("dc_2", "u1") == ["https://hooks/dc_2"]
+
+
+def test_sync_removes_triggers_no_longer_listed(upstream):
+    index = make_index()
+    upstream.listings["u1"] = [trigger("dc_1", 1), trigger("dc_2", 1)]
+    index.for_user("u1")
+
+    upstream.listings["u1"] = [trigger("dc_2", 1)]
+    index.sync_all()
+
+    assert [t["id"] for t in index.for_user("u1")] == ["dc_2"]
+    assert [t["id"] for t in index.for_app("slack")] == ["dc_2"]
+    assert index.webhook_urls("dc_1") is None
+    assert index.webhook_urls("dc_2", "someone-else") is None
+
+
+def test_queried_users_expire_but_pinned_users_stay(upstream, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(triggers.time, "time", lambda: now[0])
+    index = make_index(queried_ttl=60)
+    index.track("pinned")
+    upstream.listings["pinned"] = [trigger("dc_p", 1)]
+    upstream.listings["u1"] = [trigger("dc_1", 1)]
+    index.sync_all()
+    index.for_user("u1")
+
+    now[0] += 61
+    index.sync_all()
+
+    assert index.stats()["users"] == 1
+    assert [t["id"] for t in index.for_component("slack-new-message")] == ["dc_p"]
+
+
+def test_queried_users_are_capped_least_recently_queried_first(upstream):
+    index = make_index(max_queried=2)
+    for user in ("u1", "u2", "u3"):
+        upstream.listings[user] = [trigger(f"dc_{user}", 1)]
+    index.for_user("u1")
+    index.for_user("u2")
+    index.for_user("u1")
+    index.for_user("u3")
+
+    assert set(index._queried) == {"u1", "u3"}
+    assert index.webhook_urls("dc_u2") is None
+    assert index.stats()["users"] == 2